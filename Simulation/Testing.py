@@ -14,27 +14,46 @@
 #     # esp_back is exactly what the server would reconstruct
 #     print(dt.strftime("%H:%M"), to_hex(payload), esp_back)
 from datetime import datetime
-import time
-import requests
+import asyncio
+import httpx
 from home_env_sim import HomeEnvSim
-from lorawan_encode import encode_lorawan
+from lorawan_encode import PAYLOAD_SIZE, encode_lorawan_batch
 
 SERVER_URL = "http://localhost:8000/ingest/lorawan/raw"  # change to your server
 HOUSE_ID = "H001"
 SENSOR_ID = "esp32-01"
+MAX_IN_FLIGHT = 64  # concurrent uplinks posted to the server
 
 start = datetime.now().replace(hour=5, minute=0, second=0, microsecond=0)
 sim = HomeEnvSim(profile="intermittent", period_minutes=5, seed=123)
 
-for dt, esp in sim.generate_window(start, hours=12):
-    payload = encode_lorawan(esp)
+window = sim.generate_window(start, hours=12)
+# Encode the whole window in one pass, then post each fixed-size record.
+payloads = encode_lorawan_batch([esp for _, esp in window])
+
+
+async def post_uplink(client: httpx.AsyncClient, sem: asyncio.Semaphore, dt: datetime, payload: bytes) -> int:
     headers = {
         "X-House-Id": HOUSE_ID,
         "X-Sensor-Id": SENSOR_ID,
         "X-Timestamp": dt.isoformat(),
         "Content-Type": "application/octet-stream"
     }
-    r = requests.post(SERVER_URL, data=payload, headers=headers, timeout=5)
+    async with sem:
+        r = await client.post(SERVER_URL, content=payload, headers=headers, timeout=5)
     r.raise_for_status()
-    print(dt.strftime("%H:%M"), len(payload), "bytes ->", r.status_code)
-    # time.sleep(1)
+    return r.status_code
+
+
+async def main() -> None:
+    sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=MAX_IN_FLIGHT)) as client:
+        records = [
+            (dt, payloads[i * PAYLOAD_SIZE:(i + 1) * PAYLOAD_SIZE]) for i, (dt, _) in enumerate(window)
+        ]
+        statuses = await asyncio.gather(*(post_uplink(client, sem, dt, payload) for dt, payload in records))
+    for (dt, payload), code in zip(records, statuses):
+        print(dt.strftime("%H:%M"), len(payload), "bytes ->", code)
+
+
+asyncio.run(main())
@@ -45,11 +45,12 @@ FIELDS = [
 
 
 IDX = {f.name: i for i, f in enumerate(FIELDS)}
+_BOUNDS = {f.name: (f.lo, f.hi) for f in FIELDS}  # name -> (lo, hi), used by _clip
 
 
 def _clip(name: str, v: float) -> float:
-    f = FIELDS[IDX[name]]
-    return max(f.lo, min(f.hi, v))
+    lo, hi = _BOUNDS[name]
+    return max(lo, min(hi, v))
 
 
 def _lp(prev: float, target: float, alpha: float) -> float:
@@ -0,0 +1,30 @@
+"""add expression indexes for sensor serial lookups"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7b1e2f9c4d3a"
+down_revision: Union[str, Sequence[str], None] = "3c5a9b4a6c4b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_INDEXES = {
+    "ix_sensors_serial_number_lower": "lower(serial_number)",
+    "ix_sensors_meta_serial_number_lower": "lower(meta ->> 'serial_number')",
+    "ix_sensors_meta_serial_lower": "lower(meta ->> 'serial')",
+    "ix_sensors_meta_sn_lower": "lower(meta ->> 'sn')",
+}
+
+
+def upgrade() -> None:
+    for name, expr in _INDEXES.items():
+        op.create_index(name, "sensors", [sa.text(expr)], unique=False)
+
+
+def downgrade() -> None:
+    for name in reversed(list(_INDEXES)):
+        op.drop_index(name, table_name="sensors")
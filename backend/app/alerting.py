@@ -160,6 +160,16 @@ def get_admin_recipients() -> list[str]:
     return load_smtp_settings().to_addrs
 
 
+def has_default_recipients() -> bool:
+    """Return whether alerts without their own recipients can still be delivered.
+
+    Reads the SMTP environment on every call, exactly like :func:`dispatch_alerts`,
+    which falls back to these addresses for events that carry no recipients.
+    """
+
+    return bool(_normalize_recipients(load_smtp_settings().to_addrs))
+
+
 def _format_subject(event: ThresholdBreach) -> str:
     direction = "above" if event.threshold_kind.lower() == "upper" else "below"
     return f"Alert: {event.metric} {direction} threshold"
@@ -1,7 +1,11 @@
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession
-from .db import AsyncSessionLocal
+from .db import AsyncSessionLocal, IngestSessionLocal
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_ingest_db() -> AsyncGenerator[AsyncSession, None]:
+    async with IngestSessionLocal() as session:
+        yield session
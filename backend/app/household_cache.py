@@ -0,0 +1,53 @@
+"""In-process TTL cache of households resolved by sensor creation."""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Hashable
+
+
+@dataclass(frozen=True, slots=True)
+class CachedHousehold:
+    """Detached snapshot of the household columns a new sensor's response needs."""
+
+    id: int
+    house_id: str | None
+    householder: str | None
+
+
+class HouseholdIdCache:
+    """Map a household lookup key to a :class:`CachedHousehold` for ``ttl`` seconds.
+
+    Only successful lookups are stored, so a household registered after a
+    failed lookup is found on the next request without waiting for expiry.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[Hashable, tuple[float, CachedHousehold]] = {}
+
+    def get(self, key: Hashable) -> CachedHousehold | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, household: CachedHousehold) -> None:
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            if len(self._entries) >= self.max_entries:
+                # Still full of live entries: evict the oldest insertion.
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (now + self.ttl, household)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+household_id_cache = HouseholdIdCache()
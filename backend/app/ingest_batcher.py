@@ -0,0 +1,148 @@
+"""Coalesce concurrent ingest writes into batched COPY statements."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import IngestSessionLocal
+from .models import SensorReading
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+async def copy_readings(db: AsyncSession, rows: list[dict[str, Any]]) -> None:
+    """Write *rows* through asyncpg's COPY on the session's own connection."""
+
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        SensorReading.__tablename__,
+        records=[(r["sensor_id"], r["value"], json.dumps(r["attributes"])) for r in rows],
+        columns=["sensor_id", "value", "attributes"],
+    )
+
+
+class IngestBatcher:
+    """Merge rows submitted by concurrent ``/ingest`` calls into one COPY.
+
+    The background task waits for the first submission, then keeps draining
+    the queue until ``max_rows`` rows are collected or ``max_latency`` seconds
+    have passed, writes everything in a single transaction and resolves the
+    waiting callers' futures. If that write fails, each submission is retried
+    in its own transaction so only the callers whose rows fail see the error.
+    """
+
+    def __init__(self, max_rows: int = 10_000, max_latency: float = 0.01):
+        self.max_rows = max_rows
+        self.max_latency = max_latency
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush anything already queued, then stop the background task."""
+
+        task, queue = self._task, self._queue
+        if task is None or queue is None:
+            return
+        self._task = None
+        queue.put_nowait(_STOP)
+        await task
+
+    async def submit(self, rows: list[dict[str, Any]]) -> None:
+        """Queue *rows* for the next batch and wait until they are committed."""
+
+        if not self.running or self._queue is None:
+            raise RuntimeError("Ingest batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((rows, future))
+        await future
+
+    async def _run(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            count = len(item[0])
+            deadline = loop.time() + self.max_latency
+            while count < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                count += len(item[0])
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[list[dict[str, Any]], asyncio.Future]]) -> None:
+        rows = [row for submitted, _ in batch for row in submitted]
+        try:
+            await self._write(rows)
+        except Exception as exc:
+            if len(batch) == 1:
+                logger.exception("Failed to write batch of %d readings", len(rows))
+                _settle(batch[0][1], exc)
+                return
+            # One bad row (e.g. a sensor deleted moments ago) must not fail the
+            # unrelated requests merged with it, so retry each submission alone.
+            logger.warning(
+                "Batch of %d readings from %d requests failed (%s); retrying them one by one",
+                len(rows),
+                len(batch),
+                exc,
+            )
+            for submitted, future in batch:
+                try:
+                    await self._write(submitted)
+                except Exception as sub_exc:
+                    logger.exception("Failed to write %d readings", len(submitted))
+                    _settle(future, sub_exc)
+                else:
+                    _settle(future, None)
+            return
+
+        for _, future in batch:
+            _settle(future, None)
+
+    async def _write(self, rows: list[dict[str, Any]]) -> None:
+        async with IngestSessionLocal() as session:
+            await copy_readings(session, rows)
+            await session.commit()
+
+
+def _settle(future: asyncio.Future, exc: BaseException | None) -> None:
+    if future.done():
+        return
+    if exc is None:
+        future.set_result(None)
+    else:
+        future.set_exception(exc)
+
+ingest_batcher = IngestBatcher()
@@ -70,9 +70,12 @@
 #     import uvicorn
 #     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.ingest_batcher import ingest_batcher
 from app.routers import (
     sensors,
     ingest,
@@ -87,7 +90,19 @@ from app.routers import (
 import os
 from starlette.middleware.sessions import SessionMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ingest_batcher.start()
+    try:
+        yield
+    finally:
+        await ingest_batcher.stop()
+        await register.close_simulation_client()
+        await sensors.close_simulation_ingest_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",") if o.strip()]
 
@@ -32,6 +32,12 @@ class Sensor(Base):
     readings = relationship("SensorReading", back_populates="sensor", cascade="all, delete-orphan", passive_deletes=True)
     configs = relationship("SensorConfig", back_populates="sensor", cascade="all, delete-orphan", passive_deletes=True)
 
+# Expression indexes backing the case-insensitive serial lookups in the charts router
+Index("ix_sensors_serial_number_lower", func.lower(Sensor.serial_number))
+Index("ix_sensors_meta_serial_number_lower", func.lower(Sensor.meta.op("->>")("serial_number")))
+Index("ix_sensors_meta_serial_lower", func.lower(Sensor.meta.op("->>")("serial")))
+Index("ix_sensors_meta_sn_lower", func.lower(Sensor.meta.op("->>")("sn")))
+
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
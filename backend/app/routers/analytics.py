@@ -1,25 +1,35 @@
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import logging
 import math
 from typing import Any, Sequence
 from uuid import UUID
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import SensorReading, Sensor
 from ..deps import get_db
 from ..alerting import THRESHOLDS
-from .diseases import DISEASES
+from .diseases import DISEASES_BY_KEY
 
-router = APIRouter(prefix="/api/charts", tags=["charts"])
+# orjson serialises datetimes natively, so chart payloads carry them unformatted.
+router = APIRouter(prefix="/api/charts", tags=["charts"], default_response_class=ORJSONResponse)
 
 logger = logging.getLogger(__name__)
 
 _LOCAL_TIMEZONE = datetime.now(timezone.utc).astimezone().tzinfo or timezone.utc
 
+# Upper bound on buckets per chart request; larger windows are rejected before querying.
+MAX_STEPS = 5000
+
+# Rows fetched per round trip when streaming readings from the server-side cursor.
+STREAM_PARTITION_SIZE = 10_000
+
 
 @dataclass(slots=True)
 class TimeWindow:
@@ -42,18 +52,53 @@ ALIASES: dict[str, list[str]] = {
     "noise_night": ["noise_night", "noise", "noise_dba", "sound_level"],
 }
 
+# Lower-cased once at import so the per-request SQL filters can reuse them.
+_ALIASES_LOWER: dict[str, tuple[str, ...]] = {
+    metric: tuple(alias.lower() for alias in aliases) for metric, aliases in ALIASES.items()
+}
+
+# Reverse index used by the heatmap to map a sensor type back to its metric.
+_METRIC_BY_ALIAS: dict[str, str] = {
+    alias: metric for metric, aliases in _ALIASES_LOWER.items() for alias in aliases
+}
+
+_EMPTY_THRESHOLD: dict[str, Any] = {"unit": "", "lines": []}
+
+
+@lru_cache(maxsize=64)
+def _threshold_cfg(metric: str) -> tuple[str, list[dict]]:
+    """Return ``(unit, lines)`` for *metric*, falling back to an empty config."""
+
+    cfg = THRESHOLDS.get(metric) or _EMPTY_THRESHOLD
+    return cfg["unit"], cfg["lines"]
+
 def _parse_interval(s: str) -> timedelta:
     u = s[-1].lower()
     v = int(s[:-1])
+    if v <= 0:
+        # Zero or negative steps would divide by zero or slip past MAX_STEPS.
+        raise ValueError("bad interval")
     if u == "s": return timedelta(seconds=v)
     if u == "m": return timedelta(minutes=v)
     if u == "h": return timedelta(hours=v)
     if u == "d": return timedelta(days=v)
     raise ValueError("bad interval")
 
-def _bucket(ts: datetime, start: datetime, step: timedelta) -> datetime:
-    n = int((ts - start).total_seconds() // step.total_seconds())
-    return start + n * step
+def _epoch(value: datetime) -> float:
+    """Return POSIX seconds for *value*, treating naive datetimes as UTC."""
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _bucket_index(ts_epoch: float, start_epoch: float, step_seconds: float) -> int:
+    return int((ts_epoch - start_epoch) // step_seconds)
+
+
+def _step_count(window: TimeWindow, interval: timedelta) -> int:
+    duration = window.end - window.start
+    return max(1, math.ceil(duration.total_seconds() / interval.total_seconds()))
 
 
 def _normalize_dt(value: datetime) -> datetime:
@@ -127,11 +172,9 @@ def _resolve_window(payload: dict) -> TimeWindow:
 
 
 def _compute_risk(metric: str, value: float) -> float:
-    cfg = THRESHOLDS.get(metric)
-    if not cfg:
-        return 0.0
+    _, lines = _threshold_cfg(metric)
     risk = 0.0
-    for line in cfg["lines"]:
+    for line in lines:
         threshold = float(line["value"])
         if line["kind"] == "upper":
             if value <= threshold:
@@ -148,18 +191,34 @@ def _compute_risk(metric: str, value: float) -> float:
     return risk
 
 
-def _aggregate(values: list[float], agg: str) -> float:
-    if not values:
-        return float("nan")
+# Running per-bucket state, updated in place: [sum, min, max, count, last]
+_SUM, _MIN, _MAX, _COUNT, _LAST = range(5)
+
+
+def _accumulate(buckets: dict[int, list[float]], idx: int, value: float) -> None:
+    state = buckets.get(idx)
+    if state is None:
+        buckets[idx] = [value, value, value, 1, value]
+        return
+    state[_SUM] += value
+    if value < state[_MIN]:
+        state[_MIN] = value
+    if value > state[_MAX]:
+        state[_MAX] = value
+    state[_COUNT] += 1
+    state[_LAST] = value
+
+
+def _aggregate(state: list[float], agg: str) -> float:
     if agg == "min":
-        return min(values)
+        return state[_MIN]
     if agg == "max":
-        return max(values)
+        return state[_MAX]
     if agg == "last":
-        return values[-1]
+        return state[_LAST]
     if agg == "sum":
-        return sum(values)
-    return sum(values) / len(values)
+        return state[_SUM]
+    return state[_SUM] / state[_COUNT]
 
 
 async def _load_metric_series(
@@ -175,44 +234,83 @@ async def _load_metric_series(
     interval: timedelta,
     agg: str,
 ):
-    types = [t.lower() for t in ALIASES.get(metric, [metric])]
+    series = await _load_metric_series_many(
+        db,
+        serial=serial,
+        sensor_ids=sensor_ids,
+        metrics=(metric,),
+        start_ts=start_ts,
+        end_ts=end_ts,
+        start_bound=start_bound,
+        end_bound=end_bound,
+        interval=interval,
+        agg=agg,
+    )
+    return series.get(metric, {})
 
-    stmt = select(SensorReading.ts, SensorReading.value).join(
+
+async def _load_metric_series_many(
+    db: AsyncSession,
+    *,
+    serial: str | None,
+    sensor_ids: Sequence[UUID],
+    metrics: Sequence[str],
+    start_ts: datetime,
+    end_ts: datetime,
+    start_bound: datetime,
+    end_bound: datetime,
+    interval: timedelta,
+    agg: str,
+) -> dict[str, dict[datetime, float]]:
+    """Bucket several metrics from a single readings query.
+
+    Rows are routed to every requested metric whose aliases include the
+    sensor type; each metric keeps its own bucket base so the result matches
+    loading the metrics one at a time.
+    """
+
+    metrics_by_type: dict[str, tuple[str, ...]] = {}
+    for metric in dict.fromkeys(metrics):
+        for alias in _ALIASES_LOWER.get(metric) or (metric.lower(),):
+            metrics_by_type[alias] = metrics_by_type.get(alias, ()) + (metric,)
+
+    stmt = select(func.lower(Sensor.type), SensorReading.ts, SensorReading.value).join(
         Sensor, Sensor.id == SensorReading.sensor_id
     )
     stmt = stmt.where(
-        func.lower(Sensor.type).in_(types),
+        func.lower(Sensor.type).in_(metrics_by_type.keys()),
         SensorReading.ts >= start_bound,
         SensorReading.ts <= end_bound,
     )
 
-    serial_clause = _build_serial_join_clause(serial) if serial else None
-    if sensor_ids:
-        stmt = stmt.where(Sensor.id.in_(sensor_ids))
-        if serial_clause is not None:
-            stmt = stmt.where(or_(Sensor.id.in_(sensor_ids), serial_clause))
-    elif serial_clause is not None:
-        stmt = stmt.where(serial_clause)
-    else:
+    reading_filter = _build_reading_filter(serial, sensor_ids)
+    if reading_filter is None:
         return {}
+    stmt = stmt.where(reading_filter)
 
     stmt = stmt.order_by(SensorReading.ts.asc())
 
-    res = await db.execute(stmt)
-    rows = res.all()
-    if not rows:
-        return {}
-
-    base = _normalize_dt(rows[0][0]).replace(second=0, microsecond=0)
-    buckets: dict[datetime, list[float]] = {}
-    for ts, val in rows:
-        ts_norm = _normalize_dt(ts)
-        bucket = _bucket(ts_norm, base, interval)
-        buckets.setdefault(bucket, []).append(val)
-
-    out: dict[datetime, float] = {}
-    for ts_bucket, values in buckets.items():
-        out[ts_bucket] = _aggregate(values, agg)
+    result = await db.stream(stmt)
+    step_seconds = interval.total_seconds()
+    bases: dict[str, tuple[datetime, float]] = {}
+    buckets: dict[str, dict[int, list[float]]] = {}
+    async for partition in result.partitions(STREAM_PARTITION_SIZE):
+        for sensor_type, ts, val in partition:
+            ts_epoch = _epoch(ts)
+            for metric in metrics_by_type.get(sensor_type, ()):
+                base = bases.get(metric)
+                if base is None:
+                    base_dt = _normalize_dt(ts).replace(second=0, microsecond=0)
+                    base = bases[metric] = (base_dt, _epoch(base_dt))
+                    buckets[metric] = {}
+                _accumulate(buckets[metric], _bucket_index(ts_epoch, base[1], step_seconds), val)
+
+    out: dict[str, dict[datetime, float]] = {}
+    for metric, (base_dt, _) in bases.items():
+        out[metric] = {
+            base_dt + idx * interval: _aggregate(state, agg)
+            for idx, state in buckets[metric].items()
+        }
     return out
 
 
@@ -241,6 +339,17 @@ def _build_serial_join_clause(serial: str) -> Any:
     return or_(*conditions)
 
 
+def _build_reading_filter(serial: str | None, sensor_ids: Sequence[UUID]) -> Any | None:
+    """Combine resolved sensor ids and the serial clause into one predicate."""
+
+    serial_clause = _build_serial_join_clause(serial) if serial else None
+    if sensor_ids and serial_clause is not None:
+        return or_(Sensor.id.in_(sensor_ids), serial_clause)
+    if sensor_ids:
+        return Sensor.id.in_(sensor_ids)
+    return serial_clause
+
+
 def _build_sensor_only_serial_clause(serial: str) -> Any:
     serial_lower = serial.lower()
     conditions: list[Any] = [
@@ -304,19 +413,12 @@ async def _resolve_sensor_ids(
 
     serial_clean = serial.strip() if serial else ""
     if serial_clean:
-        try:
-            _add(UUID(serial_clean))
-        except Exception:
-            pass
-
-        serial_lower = serial_clean.lower()
-        stmt = select(Sensor.id).where(
-            or_(
-                func.lower(Sensor.serial_number) == serial_lower,
-                func.lower(Sensor.meta.op("->>")("serial_number")) == serial_lower,
-                func.lower(Sensor.meta.op("->>")("serial")) == serial_lower,
-                func.lower(Sensor.meta.op("->>")("sn")) == serial_lower,
-            )
+        # One round trip covers both the serial columns (served by the lower()
+        # expression indexes) and the primary key when the serial is a UUID.
+        stmt = (
+            select(Sensor.id)
+            .where(_build_sensor_only_serial_clause(serial_clean))
+            .distinct()
         )
         res = await db.execute(stmt)
         for (sensor_id,) in res.all():
@@ -351,19 +453,27 @@ async def metric_timeseries(payload: dict, db: AsyncSession = Depends(get_db)):
         }
 
     metric = str(payload["metric"]).lower()
-    cfg = THRESHOLDS.get(metric, {"unit": "", "lines": []})
+    unit, thresholds = _threshold_cfg(metric)
 
     try:
         window = _resolve_window(payload)
     except Exception:
         return {
             "title": "Invalid time range",
-            "unit": cfg.get("unit", ""),
+            "unit": unit,
             "labels": [],
             "series": [{"name": metric, "data": []}],
-            "thresholds": cfg.get("lines", []),
+            "thresholds": thresholds,
         }
     interval = _parse_interval(payload.get("interval", "5m"))
+    if _step_count(window, interval) > MAX_STEPS:
+        return {
+            "title": "Range too large",
+            "unit": unit,
+            "labels": [],
+            "series": [{"name": metric, "data": []}],
+            "thresholds": thresholds,
+        }
     agg = payload.get("agg", "avg")
     title = payload.get("title") or f"{metric.upper()} vs Time"
 
@@ -402,16 +512,17 @@ async def metric_timeseries(payload: dict, db: AsyncSession = Depends(get_db)):
         )
         return {
             "title": title,
-            "unit": cfg["unit"],
+            "unit": unit,
             "labels": [],
             "series": [{"name": metric, "data": []}],
-            "thresholds": cfg["lines"],
+            "thresholds": thresholds,
         }
 
+    # Rows are read in ts order, so series_map is already keyed in ascending buckets.
     labels, data = [], []
-    for k in sorted(series_map.keys()):
-        labels.append(k.isoformat())
-        data.append(series_map[k])
+    for k, v in series_map.items():
+        labels.append(k)
+        data.append(v)
 
     _log_request(
         "metric_timeseries_response",
@@ -421,7 +532,7 @@ async def metric_timeseries(payload: dict, db: AsyncSession = Depends(get_db)):
         points=len(data),
     )
 
-    return {"title": title, "unit": cfg["unit"], "labels": labels, "series": [{"name": metric, "data": data}], "thresholds": cfg["lines"]}
+    return {"title": title, "unit": unit, "labels": labels, "series": [{"name": metric, "data": data}], "thresholds": thresholds}
 
 
 @router.post("/metric_scatter")
@@ -451,20 +562,33 @@ async def metric_scatter(payload: dict, db: AsyncSession = Depends(get_db)):
             "y_thresholds": [],
         }
 
+    unit_x, x_thresholds = _threshold_cfg(x_metric)
+    unit_y, y_thresholds = _threshold_cfg(y_metric)
+
     try:
         window = _resolve_window(payload)
     except Exception:
         return {
             "title": "Invalid time range",
-            "unit_x": THRESHOLDS.get(x_metric, {}).get("unit", ""),
-            "unit_y": THRESHOLDS.get(y_metric, {}).get("unit", ""),
+            "unit_x": unit_x,
+            "unit_y": unit_y,
             "points": [],
             "best_fit": None,
-            "x_thresholds": THRESHOLDS.get(x_metric, {}).get("lines", []),
-            "y_thresholds": THRESHOLDS.get(y_metric, {}).get("lines", []),
+            "x_thresholds": x_thresholds,
+            "y_thresholds": y_thresholds,
         }
 
     interval = _parse_interval(payload.get("interval", "5m"))
+    if _step_count(window, interval) > MAX_STEPS:
+        return {
+            "title": "Range too large",
+            "unit_x": unit_x,
+            "unit_y": unit_y,
+            "points": [],
+            "best_fit": None,
+            "x_thresholds": x_thresholds,
+            "y_thresholds": y_thresholds,
+        }
     agg = payload.get("agg", "avg")
     title = payload.get("title") or f"{x_metric.upper()} vs {y_metric.upper()}"
 
@@ -481,23 +605,11 @@ async def metric_scatter(payload: dict, db: AsyncSession = Depends(get_db)):
         agg=agg,
     )
 
-    x_map = await _load_metric_series(
+    series = await _load_metric_series_many(
         db,
         serial=serial,
         sensor_ids=sensor_ids,
-        metric=x_metric,
-        start_ts=window.start,
-        end_ts=window.end,
-        start_bound=window.start_bound,
-        end_bound=window.end_bound,
-        interval=interval,
-        agg=agg,
-    )
-    y_map = await _load_metric_series(
-        db,
-        serial=serial,
-        sensor_ids=sensor_ids,
-        metric=y_metric,
+        metrics=(x_metric, y_metric),
         start_ts=window.start,
         end_ts=window.end,
         start_bound=window.start_bound,
@@ -505,6 +617,8 @@ async def metric_scatter(payload: dict, db: AsyncSession = Depends(get_db)):
         interval=interval,
         agg=agg,
     )
+    x_map = series.get(x_metric, {})
+    y_map = series.get(y_metric, {})
 
     points = []
     for bucket in sorted(set(x_map.keys()) & set(y_map.keys())):
@@ -516,7 +630,7 @@ async def metric_scatter(payload: dict, db: AsyncSession = Depends(get_db)):
             continue
         if isinstance(yv, float) and math.isnan(yv):
             continue
-        points.append({"ts": bucket.isoformat(), "x": float(xv), "y": float(yv)})
+        points.append({"ts": bucket, "x": float(xv), "y": float(yv)})
 
     best_fit = None
     if len(points) >= 2:
@@ -543,12 +657,12 @@ async def metric_scatter(payload: dict, db: AsyncSession = Depends(get_db)):
 
     return {
         "title": title,
-        "unit_x": THRESHOLDS.get(x_metric, {}).get("unit", ""),
-        "unit_y": THRESHOLDS.get(y_metric, {}).get("unit", ""),
+        "unit_x": unit_x,
+        "unit_y": unit_y,
         "points": points,
         "best_fit": best_fit,
-        "x_thresholds": THRESHOLDS.get(x_metric, {}).get("lines", []),
-        "y_thresholds": THRESHOLDS.get(y_metric, {}).get("lines", []),
+        "x_thresholds": x_thresholds,
+        "y_thresholds": y_thresholds,
     }
 
 
@@ -578,14 +692,22 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
         }
 
     interval = _parse_interval(payload.get("interval", "1h"))
+    steps = _step_count(window, interval)
+    if steps > MAX_STEPS:
+        return {
+            "title": "Range too large",
+            "start": window.start,
+            "end": window.end,
+            "interval": payload.get("interval", "1h"),
+            "labels": [],
+            "rows": [],
+        }
     agg = payload.get("agg", "avg")
     disease_key = payload.get("disease_key") or payload.get("disease")
     disease_metrics: list[str] | None = None
-    if disease_key:
-        for d in DISEASES:
-            if d.get("key") == disease_key:
-                disease_metrics = [str(m).lower() for m in d.get("metrics", []) if str(m).strip()]
-                break
+    disease = DISEASES_BY_KEY.get(disease_key) if isinstance(disease_key, str) else None
+    if disease is not None:
+        disease_metrics = [str(m).lower() for m in disease.get("metrics", []) if str(m).strip()]
 
     metrics = payload.get("metrics") or disease_metrics or list(THRESHOLDS.keys())
     metrics = [str(m).lower() for m in metrics if str(m).strip()]
@@ -593,8 +715,8 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
     if not metrics:
         return {
             "title": payload.get("title") or "Risk Heatmap",
-            "start": window.start.isoformat(),
-            "end": window.end.isoformat(),
+            "start": window.start,
+            "end": window.end,
             "interval": payload.get("interval", "1h"),
             "labels": [],
             "rows": [],
@@ -613,10 +735,10 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
         agg=agg,
     )
 
-    alias_to_metric: dict[str, str] = {}
-    for metric in metrics:
-        for alias in ALIASES.get(metric, [metric]):
-            alias_to_metric[alias.lower()] = metric
+    requested = set(metrics)
+    alias_to_metric = {
+        alias: metric for alias, metric in _METRIC_BY_ALIAS.items() if metric in requested
+    }
 
     sensor_stmt = select(func.lower(Sensor.type), Sensor.meta).where(
         func.lower(Sensor.type).in_(alias_to_metric.keys())
@@ -629,8 +751,8 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
     else:
         return {
             "title": payload.get("title") or "Risk Heatmap",
-            "start": window.start.isoformat(),
-            "end": window.end.isoformat(),
+            "start": window.start,
+            "end": window.end,
             "interval": payload.get("interval", "1h"),
             "labels": [],
             "rows": [],
@@ -663,78 +785,60 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
         SensorReading.ts <= window.end_bound,
     )
 
-    serial_clause = _build_serial_join_clause(serial) if serial else None
-    if sensor_ids:
-        stmt = stmt.where(Sensor.id.in_(sensor_ids))
-        if serial_clause is not None:
-            stmt = stmt.where(or_(Sensor.id.in_(sensor_ids), serial_clause))
-    elif serial_clause is not None:
-        stmt = stmt.where(serial_clause)
-    else:
+    reading_filter = _build_reading_filter(serial, sensor_ids)
+    if reading_filter is None:
         return {
             "title": payload.get("title") or "Risk Heatmap",
-            "start": window.start.isoformat(),
-            "end": window.end.isoformat(),
+            "start": window.start,
+            "end": window.end,
             "interval": payload.get("interval", "1h"),
             "labels": [],
             "rows": [],
         }
+    stmt = stmt.where(reading_filter)
 
     stmt = stmt.order_by(SensorReading.ts.asc())
-    res = await db.execute(stmt)
-    rows = res.all()
 
-    duration = window.end - window.start
-    steps = max(1, math.ceil(duration.total_seconds() / interval.total_seconds()))
-    labels_dt = [window.start + i * interval for i in range(steps)]
     step_seconds = interval.total_seconds()
+    start_epoch = _epoch(window.start)
 
-    metric_buckets: dict[str, dict[int, list[float]]] = {m: {} for m in metrics}
+    metric_buckets: defaultdict[str, dict[int, list[float]]] = defaultdict(dict)
 
-    for sensor_type, ts, value in rows:
-        metric = alias_to_metric.get(sensor_type)
-        if metric is None:
-            continue
-        metric_has_sensor[metric] = True
-        if metric not in metric_disabled_explicit and not metric_enabled.get(metric):
-            metric_enabled[metric] = True
-        ts_norm = _normalize_dt(ts)
-        delta = (ts_norm - window.start).total_seconds()
-        if delta < 0:
-            continue
-        idx = int(delta // step_seconds)
-        if idx >= steps:
-            idx = steps - 1
-        metric_buckets.setdefault(metric, {}).setdefault(idx, []).append(value)
+    result = await db.stream(stmt)
+    async for partition in result.partitions(STREAM_PARTITION_SIZE):
+        for sensor_type, ts, value in partition:
+            metric = alias_to_metric.get(sensor_type)
+            if metric is None:
+                continue
+            metric_has_sensor[metric] = True
+            if metric not in metric_disabled_explicit and not metric_enabled.get(metric):
+                metric_enabled[metric] = True
+            idx = _bucket_index(_epoch(ts), start_epoch, step_seconds)
+            if idx < 0:
+                continue
+            if idx >= steps:
+                idx = steps - 1
+            _accumulate(metric_buckets[metric], idx, value)
 
     heatmap_rows = []
     for metric in metrics:
-        cfg = THRESHOLDS.get(metric, {"unit": "", "lines": []})
+        unit, thresholds = _threshold_cfg(metric)
         buckets = metric_buckets.get(metric, {})
         values: list[float | None] = []
         risks: list[float | None] = []
         for i in range(steps):
-            vals = buckets.get(i)
-            if not vals:
+            state = buckets.get(i)
+            if state is None:
                 values.append(None)
                 risks.append(None)
                 continue
-            if agg == "min":
-                v = min(vals)
-            elif agg == "max":
-                v = max(vals)
-            elif agg == "last":
-                v = vals[-1]
-            elif agg == "sum":
-                v = sum(vals)
-            else:
-                v = sum(vals) / len(vals)
+            v = _aggregate(state, agg)
             values.append(v)
             risks.append(_compute_risk(metric, v))
         heatmap_rows.append({
             "metric": metric,
-            "unit": cfg.get("unit", ""),
-            "thresholds": cfg.get("lines", []),
+            "unit": unit,
+            "thresholds": thresholds,
             "values": values,
             "risk": risks,
             "enabled": metric_enabled.get(metric, False),
@@ -747,14 +851,14 @@ async def risk_heatmap(payload: dict, db: AsyncSession = Depends(get_db)):
         sensor_ids=[str(s) for s in sensor_ids],
         metrics=metrics,
         rows=len(heatmap_rows),
-        labels=len(labels_dt),
+        labels=steps,
     )
 
     return {
         "title": payload.get("title") or "Risk Heatmap",
-        "start": window.start.isoformat(),
-        "end": window.end.isoformat(),
+        "start": window.start,
+        "end": window.end,
         "interval": payload.get("interval", "1h"),
-        "labels": [dt.isoformat() for dt in labels_dt],
+        "labels": [window.start + i * interval for i in range(steps)],
         "rows": heatmap_rows,
     }
@@ -1,16 +1,26 @@
 # app/routers/diseases.py
 from __future__ import annotations
 
-import json
+import os
+import tempfile
+from contextlib import suppress
 from pathlib import Path
 from typing import Any
 
+import orjson
 from fastapi import APIRouter, HTTPException, Response, status
 from pydantic import BaseModel, Field
 
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so concurrent writers are not serialised there.
+    fcntl = None
+
 router = APIRouter(prefix="/api/diseases", tags=["diseases"])
 
 DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "diseases.json"
+# Serialises writers across worker processes sharing the data directory.
+LOCK_FILE = DATA_FILE.with_name(".diseases.lock")
 
 # Adjust these as needed: key, display name, and associated metric keys
 # Metric keys must match the ones returned by /api/charts/metrics (e.g. temp, co2, pm25, rh, no2, co, o2, light_night, noise_night)
@@ -94,7 +104,23 @@ def _default_diseases() -> list[dict[str, Any]]:
 
 def _write_diseases(diseases: list[dict[str, Any]]) -> None:
     DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    DATA_FILE.write_text(json.dumps(diseases, ensure_ascii=False, indent=2), encoding="utf-8")
+    payload = orjson.dumps(diseases, option=orjson.OPT_INDENT_2)
+    with open(LOCK_FILE, "ab") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Write a sibling temp file and swap it in so readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=DATA_FILE.parent, prefix=".diseases-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                if hasattr(os, "fchmod"):
+                    # mkstemp creates 0600 files; keep the data file world-readable like before.
+                    os.fchmod(tmp.fileno(), 0o644)
+                tmp.write(payload)
+            os.replace(tmp_path, DATA_FILE)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+            raise
 
 
 def _load_diseases() -> list[dict[str, Any]]:
@@ -104,7 +130,7 @@ def _load_diseases() -> list[dict[str, Any]]:
             _write_diseases(diseases)
             return diseases
 
-        raw = json.loads(DATA_FILE.read_text(encoding="utf-8"))
+        raw = orjson.loads(DATA_FILE.read_bytes())
         diseases: list[dict[str, Any]] = []
         if isinstance(raw, list):
             for item in raw:
@@ -116,12 +142,12 @@ def _load_diseases() -> list[dict[str, Any]]:
         if not diseases:
             diseases = _default_diseases()
 
-        _write_diseases(diseases)
+        # Reading never writes back: normalised entries are persisted on the next save.
         return diseases
     except OSError:
         # I/O errors should not break the application start-up; fall back to defaults.
         return _default_diseases()
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         diseases = _default_diseases()
         try:
             _write_diseases(diseases)
@@ -137,7 +163,18 @@ def _save_diseases() -> None:
         raise HTTPException(status_code=500, detail="Failed to persist disease configuration") from exc
 
 
+def _index_diseases(diseases: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Map disease keys to their entries; the first entry wins on duplicates."""
+
+    index: dict[str, dict[str, Any]] = {}
+    for disease in diseases:
+        index.setdefault(disease["key"], disease)
+    return index
+
+
 DISEASES = _load_diseases()
+# Shares the entry dicts with DISEASES; both must be updated together.
+DISEASES_BY_KEY = _index_diseases(DISEASES)
 
 
 @router.get("/", summary="List all diseases and their associated metrics")
@@ -146,47 +183,47 @@ def list_diseases():
 
 @router.get("/{key}", summary="Get a single disease definition")
 def get_disease(key: str):
-    for d in DISEASES:
-        if d["key"] == key:
-            return d
-    raise HTTPException(status_code=404, detail="Disease not found")
+    disease = DISEASES_BY_KEY.get(key)
+    if disease is None:
+        raise HTTPException(status_code=404, detail="Disease not found")
+    return disease
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, summary="Create a disease configuration")
 def create_disease(payload: DiseasePayload):
     key = _ensure_key(payload.key)
-    for disease in DISEASES:
-        if disease["key"] == key:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Disease key already exists")
+    if key in DISEASES_BY_KEY:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Disease key already exists")
 
     name = str(payload.name or "").strip() or key
     metrics = _normalize_metrics(payload.metrics)
     disease = {"key": key, "name": name, "metrics": metrics}
     DISEASES.append(disease)
+    DISEASES_BY_KEY[key] = disease
     _save_diseases()
     return disease
 
 
 @router.put("/{key}", summary="Update a disease configuration")
 def update_disease(key: str, payload: DiseaseUpdatePayload):
-    for disease in DISEASES:
-        if disease["key"] == key:
-            if payload.name is not None:
-                name = str(payload.name or "").strip()
-                if name:
-                    disease["name"] = name
-            if payload.metrics is not None:
-                disease["metrics"] = _normalize_metrics(payload.metrics)
-            _save_diseases()
-            return disease
-    raise HTTPException(status_code=404, detail="Disease not found")
+    disease = DISEASES_BY_KEY.get(key)
+    if disease is None:
+        raise HTTPException(status_code=404, detail="Disease not found")
+    if payload.name is not None:
+        name = str(payload.name or "").strip()
+        if name:
+            disease["name"] = name
+    if payload.metrics is not None:
+        disease["metrics"] = _normalize_metrics(payload.metrics)
+    _save_diseases()
+    return disease
 
 
 @router.delete("/{key}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a disease configuration")
 def delete_disease(key: str):
-    for idx, disease in enumerate(DISEASES):
-        if disease["key"] == key:
-            DISEASES.pop(idx)
-            _save_diseases()
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
-    raise HTTPException(status_code=404, detail="Disease not found")
+    disease = DISEASES_BY_KEY.pop(key, None)
+    if disease is None:
+        raise HTTPException(status_code=404, detail="Disease not found")
+    DISEASES[:] = [d for d in DISEASES if d["key"] != key]
+    _save_diseases()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
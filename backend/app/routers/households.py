@@ -17,11 +17,19 @@ async def list_households(
     limit: int = Query(200, ge=1, le=1000),
     offset: int = Query(0, ge=0),
 ):
-    stmt = select(Household)
+    # Select only the columns HouseholdOut exposes; FastAPI validates the rows once via response_model.
+    stmt = select(
+        Household.id,
+        Household.house_id,
+        Household.householder,
+        Household.phone,
+        Household.email,
+        Household.address,
+        Household.zone,
+    )
     if q:
         stmt = stmt.where(Household.householder.ilike(f"%{q}%"))
 
     stmt = stmt.order_by(Household.householder.asc()).limit(limit).offset(offset)
     res = await db.execute(stmt)
-    rows = res.scalars().all()
-    return [HouseholdOut.model_validate(row) for row in rows]
+    return res.mappings().all()
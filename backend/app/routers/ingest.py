@@ -1,9 +1,10 @@
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any, List, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import insert, select, text
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..alerting import (
@@ -11,81 +12,82 @@ from ..alerting import (
     dispatch_alerts,
     evaluate_thresholds,
     get_metric_unit,
+    has_default_recipients,
 )
-from ..deps import get_db
-from ..models import Household, Sensor, SensorReading
+from ..deps import get_ingest_db
+from ..ingest_batcher import copy_readings, ingest_batcher
+from ..models import SensorReading
+from ..sensor_cache import CachedSensor, sensor_cache
 
 router = APIRouter(tags=["ingest"])
 
+# Batches at least this large are written with COPY; smaller ones use a plain INSERT.
+COPY_THRESHOLD = 100
+
+# Shared by every row without attributes; never mutate it.
+_EMPTY_ATTRS: dict[str, Any] = {}
+
+
+@lru_cache(maxsize=4096)
+def _parse_uuid(value: str) -> UUID:
+    # Ingest traffic comes from a small fleet of sensors, so ids repeat constantly.
+    return UUID(value)
+
+
 # Simple input coercion (dict payloads are also accepted)
 def _coerce_row(row: dict[str, Any]) -> dict[str, Any]:
     try:
-        sid = UUID(str(row["sensor_id"]))
+        raw_id = row["sensor_id"]
+        sid = _parse_uuid(raw_id if isinstance(raw_id, str) else str(raw_id))
         val = float(row["value"])
     except Exception:
         raise HTTPException(status_code=400, detail="bad sensor_id or value")
-    attrs = row.get("attributes") or {}
-    if not isinstance(attrs, dict):
-        attrs = {}
+    attrs = row.get("attributes")
+    if not attrs or not isinstance(attrs, dict):
+        attrs = _EMPTY_ATTRS
     return {"sensor_id": sid, "value": val, "attributes": attrs}
 
-def _is_sensor_enabled(sensor: Sensor) -> bool:
-    meta = sensor.meta if isinstance(sensor.meta, dict) else {}
-    if "enabled" not in meta:
-        return True
-    value = meta["enabled"]
-    if isinstance(value, str):
-        return value.strip().lower() not in {"false", "0", "off", "no"}
-    return bool(value)
 
+async def _ingest_rows(db: AsyncSession, rows: list[dict[str, Any]], *, use_batcher: bool = True) -> int:
+    """Validate, store and alert on *rows*; return how many readings were written."""
 
-@router.post("/ingest")
-async def ingest(payload: Union[dict, List[dict]], db: AsyncSession = Depends(get_db)):
-    rows = payload if isinstance(payload, list) else [payload]
     data = [_coerce_row(r) for r in rows]
 
     sensor_ids = {row["sensor_id"] for row in data}
-    sensors: dict[UUID, Sensor] = {}
+    sensors: dict[UUID, CachedSensor] = {}
     if sensor_ids:
-        stmt = select(Sensor).where(Sensor.id.in_(tuple(sensor_ids)))
-        sensor_rows = await db.execute(stmt)
-        sensors = {sensor.id: sensor for sensor in sensor_rows.scalars()}
+        sensors = await sensor_cache.get_many(db, sensor_ids)
 
-    owner_ids = {sensor.owner_id for sensor in sensors.values() if sensor and sensor.owner_id}
-    households: dict[int, Household] = {}
-    if owner_ids:
-        stmt = select(Household).where(Household.id.in_(tuple(owner_ids)))
-        household_rows = await db.execute(stmt)
-        households = {household.id: household for household in household_rows.scalars()}
+    recorded_at = datetime.now(timezone.utc)
+    default_recipients = has_default_recipients()
+
+    # Resolve everything that depends only on the sensor once, not per row.
+    # Disabled and untyped sensors are left out, so their rows are dropped below.
+    per_sensor: dict[UUID, tuple[CachedSensor, str, str, tuple[str, ...] | None, bool]] = {}
+    for sid, sensor in sensors.items():
+        if not sensor.type or not sensor.enabled:
+            continue
+        metric = sensor.type.lower()
+        recipients = (sensor.owner_email,) if sensor.owner_email else None
+        # Alerts nobody would receive are dropped by dispatch_alerts; skip building them.
+        alerting = recipients is not None or default_recipients
+        per_sensor[sid] = (sensor, metric, get_metric_unit(metric), recipients, alerting)
 
     events: list[ThresholdBreach] = []
     filtered: list[dict[str, Any]] = []
     for row in data:
-        sensor = sensors.get(row["sensor_id"])
-        if not sensor or not sensor.type:
-            continue
-        if not _is_sensor_enabled(sensor):
+        entry = per_sensor.get(row["sensor_id"])
+        if entry is None:
             continue
 
         filtered.append(row)
-        metric = sensor.type.lower()
+        sensor, metric, unit, recipients, alerting = entry
+        if not alerting:
+            continue
         triggered = evaluate_thresholds(metric, row["value"])
         if not triggered:
             continue
-        attrs = row.get("attributes") or {}
-        unit = get_metric_unit(metric)
-        sensor_serial = sensor.serial_number or attrs.get("serial_number")
-        recorded_at = datetime.now(timezone.utc)
-        recipients: tuple[str, ...] | None = None
-        candidate_recipients: list[str] = []
-        if sensor and sensor.owner_id:
-            household = households.get(sensor.owner_id)
-            if household and household.email:
-                email = household.email.strip()
-                if email:
-                    candidate_recipients.append(email)
-        if candidate_recipients:
-            recipients = tuple(dict.fromkeys(candidate_recipients))
+        sensor_serial = sensor.serial_number or row["attributes"].get("serial_number")
 
         for line in triggered:
             try:
@@ -109,14 +111,41 @@ async def ingest(payload: Union[dict, List[dict]], db: AsyncSession = Depends(ge
             )
 
     if not filtered:
-        return {"ok": True, "n": 0}
-
-    # Writes should only insert. Avoid JOINs, sensor lookups, or other heavy logic here.
-    # Optional: disable synchronous commit to reduce persistence latency (risking the newest rows on power loss) and improve throughput
-    await db.execute(text("SET LOCAL synchronous_commit = OFF"))
+        return 0
 
-    stmt = insert(SensorReading).values(filtered)
-    await db.execute(stmt)
-    await db.commit()
+    if use_batcher and ingest_batcher.running:
+        # Concurrent requests are merged into a single COPY by the background batcher.
+        # End the sensor lookup's transaction first: the batcher needs a connection from
+        # the same ingest pool, and callers parked in submit() must not be holding them.
+        await db.rollback()
+        await ingest_batcher.submit(filtered)
+    else:
+        # Writes should only insert. Avoid JOINs, sensor lookups, or other heavy logic here.
+        # Ingest sessions run with synchronous_commit off (see app.db.ingest_engine).
+        if len(filtered) >= COPY_THRESHOLD:
+            await copy_readings(db, filtered)
+        else:
+            await db.execute(insert(SensorReading), filtered)
+        await db.commit()
     await dispatch_alerts(events)
-    return {"ok": True, "n": len(filtered)}
+    return len(filtered)
+
+
+@router.post("/ingest", status_code=status.HTTP_204_NO_CONTENT)
+async def ingest(payload: Union[dict, List[dict]], db: AsyncSession = Depends(get_ingest_db)):
+    # Devices only need to know the write succeeded; an empty 204 saves encoding and parsing a body.
+    rows = payload if isinstance(payload, list) else [payload]
+    await _ingest_rows(db, rows)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/ingest/bulk")
+async def ingest_bulk(payload: Union[dict, List[dict]], db: AsyncSession = Depends(get_ingest_db)):
+    """Write a whole batch of readings (a list, or ``{"readings": [...]}``) in one transaction."""
+
+    rows = payload.get("readings") if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="readings must be a list")
+    # A single large batch is already one COPY/INSERT; no need to wait for the batcher.
+    n = await _ingest_rows(db, rows, use_batcher=False)
+    return {"inserted": n}
@@ -1,20 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from sqlalchemy import select, desc
-from datetime import datetime
+from datetime import datetime, timezone
 from ..models import SensorReading
 from ..deps import get_db
-from typing import Iterable
+from typing import AsyncGenerator, AsyncIterator, Sequence
+from uuid import UUID
 import csv
+import re
 from io import StringIO
-import json
+import orjson
+
+
+# Canonical UTC form sent by the frontend, e.g. 2025-01-01T12:00:00.000Z
+_ISO_UTC_FAST = re.compile(r"^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?Z$")
 
 
 def _parse_iso_datetime(value: str | None, field_name: str) -> datetime | None:
     if not value:
         return None
     try:
+        match = _ISO_UTC_FAST.match(value)
+        if match:
+            year, month, day, hour, minute, second, fraction = match.groups()
+            return datetime(
+                int(year),
+                int(month),
+                int(day),
+                int(hour),
+                int(minute),
+                int(second),
+                int(fraction.ljust(6, "0")) if fraction else 0,
+                tzinfo=timezone.utc,
+            )
         normalized = value.strip()
         if not normalized:
             return None
@@ -25,28 +45,43 @@ def _parse_iso_datetime(value: str | None, field_name: str) -> datetime | None:
         raise HTTPException(status_code=400, detail=f"Invalid {field_name}. Use ISO-8601 format.") from exc
 
 
-async def _fetch_readings(
-    db: AsyncSession,
-    sensor_id: str,
+# Rows rendered per chunk of the streamed CSV export.
+EXPORT_CHUNK_SIZE = 500
+
+
+def _latest_readings_stmt(
+    sensor_id: UUID | str,
     start_dt: datetime | None,
     end_dt: datetime | None,
     limit: int,
-) -> list[SensorReading]:
+):
+    """Select the newest *limit* readings, returned in ascending ``ts`` order."""
+
     stmt = select(SensorReading).where(SensorReading.sensor_id == sensor_id)
     if start_dt:
         stmt = stmt.where(SensorReading.ts >= start_dt)
     if end_dt:
         stmt = stmt.where(SensorReading.ts <= end_dt)
-    stmt = stmt.order_by(desc(SensorReading.ts)).limit(limit)
+    latest = stmt.order_by(desc(SensorReading.ts)).limit(limit).subquery()
+    reading = aliased(SensorReading, latest)
+    return select(reading).order_by(reading.ts.asc())
 
+
+async def _fetch_readings(
+    db: AsyncSession,
+    sensor_id: str,
+    start_dt: datetime | None,
+    end_dt: datetime | None,
+    limit: int,
+) -> list[SensorReading]:
+    # Postgres returns the newest rows already in ascending order for visualisation
+    stmt = _latest_readings_stmt(sensor_id, start_dt, end_dt, limit)
     res = await db.execute(stmt)
-    rows = res.scalars().all()
-    # Return ascending order to make visualisation easier to read
-    return rows[::-1]
+    return res.scalars().all()
 
 router = APIRouter()
 
-@router.post("/api/readings/query")
+@router.post("/api/readings/query", response_class=ORJSONResponse)
 async def query_readings(payload: dict, db: AsyncSession = Depends(get_db)):
     sensor_id = payload["sensor_id"]
     start_ts = payload.get("start_ts")
@@ -63,51 +98,87 @@ async def query_readings(payload: dict, db: AsyncSession = Depends(get_db)):
 
     rows = await _fetch_readings(db, sensor_id, start_dt, end_dt, limit)
 
-    return [
-        {
-            "id": r.id,
-            "sensor_id": str(r.sensor_id),
-            "ts": r.ts.isoformat(),
-            "value": r.value,
-            "attributes": r.attributes,
-        }
-        for r in rows
-    ]
-
-
-def _render_csv(rows: Iterable[SensorReading]) -> str:
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(["id", "sensor_id", "timestamp", "value", "attributes"])
-    for r in rows:
-        writer.writerow(
-            [
-                r.id,
-                str(r.sensor_id),
-                r.ts.isoformat(),
-                r.value,
-                "" if r.attributes is None else json.dumps(r.attributes, ensure_ascii=False),
-            ]
-        )
+    # Columns rather than one object per reading: far fewer keys to encode and send.
+    return {
+        "sensor_id": sensor_id,
+        "ids": [r.id for r in rows],
+        "ts": [r.ts for r in rows],
+        "values": [r.value for r in rows],
+        "attributes": [r.attributes for r in rows],
+    }
+
+
+def _drain(buffer: StringIO) -> str:
+    chunk = buffer.getvalue()
     buffer.seek(0)
-    return buffer.getvalue()
+    buffer.truncate()
+    return chunk
+
+
+async def _render_csv(
+    sessions: AsyncGenerator[AsyncSession, None],
+    first: Sequence[SensorReading],
+    partitions: AsyncIterator[Sequence[SensorReading]],
+) -> AsyncIterator[str]:
+    """Yield the CSV export chunk by chunk while rows stream from the cursor.
+
+    *first* is the partition the endpoint already fetched. *sessions* is the
+    ``get_db`` generator owning the cursor's session; it is closed once the
+    body has been sent.
+    """
+
+    try:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "sensor_id", "timestamp", "value", "attributes"])
+        partition = first
+        while True:
+            for r in partition:
+                writer.writerow(
+                    [
+                        r.id,
+                        str(r.sensor_id),
+                        r.ts.isoformat(),
+                        r.value,
+                        "" if r.attributes is None else orjson.dumps(r.attributes).decode(),
+                    ]
+                )
+            yield _drain(buffer)
+            partition = await anext(partitions, None)
+            if partition is None:
+                break
+    finally:
+        await sessions.aclose()
 
 
 @router.get("/api/readings/export")
 async def export_readings(
-    sensor_id: str,
+    request: Request,
+    sensor_id: UUID,
     start_ts: str | None = None,
     end_ts: str | None = None,
     limit: int = Query(500, gt=0, le=10000),
-    db: AsyncSession = Depends(get_db),
 ):
     start_dt = _parse_iso_datetime(start_ts, "start_ts")
     end_dt = _parse_iso_datetime(end_ts, "end_ts")
 
-    rows = await _fetch_readings(db, sensor_id, start_dt, end_dt, limit)
+    stmt = _latest_readings_stmt(sensor_id, start_dt, end_dt, limit)
+
+    # Dependency cleanup runs before a streaming body is sent, so drive get_db (or its
+    # override) here and let the body close it. Running the query and fetching the first
+    # partition before responding keeps DB errors as proper error responses rather than
+    # a truncated "successful" download.
+    sessions = request.app.dependency_overrides.get(get_db, get_db)()
+    try:
+        db = await anext(sessions)
+        result = await db.stream_scalars(stmt)
+        partitions = result.partitions(EXPORT_CHUNK_SIZE)
+        first = await anext(partitions, [])
+    except BaseException:
+        await sessions.aclose()
+        raise
 
-    csv_content = _render_csv(rows)
     filename = f"sensor_{sensor_id}_readings.csv"
-    response = StreamingResponse(iter([csv_content]), media_type="text/csv")
+    response = StreamingResponse(_render_csv(sessions, first, partitions), media_type="text/csv")
     response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
@@ -1,20 +1,25 @@
+import logging
 import os
 from contextlib import suppress
 from typing import Any
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import insert, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.alerting import get_admin_recipients, send_simple_email
 from app.schemas import RegisterIn, RegisterOut
+from app.household_cache import household_id_cache
 from app.models import Household
+from app.sensor_cache import sensor_cache
 from app.utils import build_house_id
 from app.db import get_db
 
 router = APIRouter(prefix="/api", tags=["registration"])
 
+logger = logging.getLogger(__name__)
+
 
 class SimulationConfigError(Exception):
     """Base error for simulation config failures."""
@@ -26,6 +31,26 @@ class SimulationConfigSerialNotFound(SimulationConfigError):
 
 _MISSING = object()
 
+# Shared client so registrations and their compensating calls reuse keep-alive connections.
+_sim_client: httpx.AsyncClient | None = None
+
+
+def _simulation_client() -> httpx.AsyncClient:
+    global _sim_client
+    if _sim_client is None:
+        _sim_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0, read=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+    return _sim_client
+
+
+async def close_simulation_client() -> None:
+    global _sim_client
+    client, _sim_client = _sim_client, None
+    if client is not None:
+        await client.aclose()
+
 
 def _simulation_api_base() -> str:
     base = os.environ.get("SIMULATION_API_BASE", "http://simulation:8001").strip()
@@ -83,10 +108,8 @@ async def _update_simulation_registration(
         "registered": _field_action(registered),
     }
 
-    timeout = httpx.Timeout(5.0, read=5.0)
     try:
-        async with httpx.AsyncClient(base_url=base, timeout=timeout) as client:
-            response = await client.post("/api/simulation/register", json=payload)
+        response = await _simulation_client().post(f"{base}/api/simulation/register", json=payload)
     except httpx.RequestError as exc:  # pragma: no cover - network failure
         raise SimulationConfigError("Failed to contact simulation service") from exc
 
@@ -107,18 +130,24 @@ async def _update_simulation_registration(
 
 
 @router.post("/register", response_model=RegisterOut, status_code=status.HTTP_201_CREATED)
-async def register(data: RegisterIn, db: AsyncSession = Depends(get_db)):
+async def register(
+    data: RegisterIn,
+    background: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
     first_name = data.first_name.strip()
     last_name = data.last_name.strip()
     if not first_name or not last_name:
         raise HTTPException(status_code=422, detail="first_name and last_name must not be empty")
     house_id = build_house_id(data.zone, first_name, last_name, data.serial_number)
     householder = " ".join(part for part in (first_name, last_name) if part)
-    q1 = select(Household).where(Household.serial_number == data.serial_number)
-    q2 = select(Household).where(Household.house_id == house_id)
-    if (await db.execute(q1)).scalars().first():
+    stmt = select(Household.serial_number, Household.house_id).where(
+        or_(Household.serial_number == data.serial_number, Household.house_id == house_id)
+    )
+    existing = (await db.execute(stmt)).all()
+    if any(row.serial_number == data.serial_number for row in existing):
         raise HTTPException(status_code=409, detail="Serial number already exists")
-    if (await db.execute(q2)).scalars().first():
+    if any(row.house_id == house_id for row in existing):
         raise HTTPException(status_code=409, detail="House ID conflict")
     try:
         previous_state = await _update_simulation_registration(
@@ -131,19 +160,22 @@ async def register(data: RegisterIn, db: AsyncSession = Depends(get_db)):
     except SimulationConfigError as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
-    obj = Household(
-        serial_number=data.serial_number,
-        householder=householder,
-        phone=data.phone,
-        email=data.email,
-        address=data.address,
-        zone=data.zone,
-        house_id=house_id,
+    stmt = (
+        insert(Household)
+        .values(
+            serial_number=data.serial_number,
+            householder=householder,
+            phone=data.phone,
+            email=data.email,
+            address=data.address,
+            zone=data.zone,
+            house_id=house_id,
+        )
+        .returning(Household.id)
     )
-    db.add(obj)
-    print("INSERT", house_id)
 
     try:
+        household_id = (await db.execute(stmt)).scalar_one()
         await db.commit()
     except Exception:
         await db.rollback()
@@ -155,7 +187,15 @@ async def register(data: RegisterIn, db: AsyncSession = Depends(get_db)):
             )
         raise
 
-    await send_simple_email(
+    logger.info("Registered household %s (id=%s)", house_id, household_id)
+
+    # Cached sensor entries carry their owner's contact details.
+    sensor_cache.clear()
+    household_id_cache.clear()
+
+    # Notify the admins after the response is sent; SMTP is slow and failures are only logged.
+    background.add_task(
+        send_simple_email,
         subject=f"New household registration: {house_id}",
         body="\n".join(
             filter(
@@ -1,12 +1,15 @@
 from uuid import UUID
 from typing import Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..deps import get_db
+from ..household_cache import CachedHousehold, household_id_cache
 from ..models import Sensor, Household
 from ..schemas import SensorCreate, SensorOut
+from ..sensor_cache import sensor_cache
 from datetime import datetime
 import httpx
 
@@ -17,14 +20,36 @@ try:
 except Exception:
     HAVE_SIM = False
 
-router = APIRouter(prefix="/sensors", tags=["sensors"])
+router = APIRouter(prefix="/sensors", tags=["sensors"], default_response_class=ORJSONResponse)
 
+# Reading keys checked, in priority order, for the value of a simulated dict reading.
+_VALUE_KEYS = ("value", "temperature", "temp", "humidity", "pm2_5", "co2")
 
-def to_sensor_out(row: Sensor) -> SensorOut:
-    household = getattr(row, "household", None)
+# Shared client so repeated simulations reuse keep-alive connections to the ingest URL.
+_ingest_client: httpx.AsyncClient | None = None
+
+
+def _simulation_ingest_client() -> httpx.AsyncClient:
+    global _ingest_client
+    if _ingest_client is None:
+        _ingest_client = httpx.AsyncClient(timeout=5)
+    return _ingest_client
+
+
+async def close_simulation_ingest_client() -> None:
+    global _ingest_client
+    client, _ingest_client = _ingest_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def to_sensor_out(row: Sensor, household: Household | CachedHousehold | None = None) -> SensorOut:
+    if household is None:
+        household = getattr(row, "household", None)
     house_id = getattr(household, "house_id", None) if household else None
     householder = getattr(household, "householder", None) if household else None
-    return SensorOut(
+    # Columns come straight from the database, so skip per-field validation here.
+    return SensorOut.model_construct(
         id=row.id,
         name=row.name,
         type=row.type,
@@ -47,7 +72,18 @@ async def list_sensors(
     limit: int = Query(50, ge=1, le=1000),
     offset: int = Query(0, ge=0),
 ):
-    stmt = select(Sensor).options(selectinload(Sensor.household))
+    # Project just the SensorOut columns, household fields included, so no ORM
+    # objects are built; the outer join keeps unowned sensors.
+    stmt = select(
+        Sensor.id,
+        Sensor.name,
+        Sensor.type,
+        Sensor.location,
+        Sensor.serial_number,
+        Sensor.meta,
+        Household.house_id,
+        Household.householder,
+    ).outerjoin(Household, Sensor.owner_id == Household.id)
     if sensor_type:
         stmt = stmt.where(Sensor.type == sensor_type)
     if q:
@@ -56,24 +92,20 @@ async def list_sensors(
     if owner_id is not None:
         stmt = stmt.where(Sensor.owner_id == owner_id)
     elif house_id:
-        sub = select(Household.id).where(Household.house_id == house_id).scalar_subquery()
-        stmt = stmt.where(Sensor.owner_id == sub)
+        stmt = stmt.where(Household.house_id == house_id)
         # If you still need to support legacy data where owner_id is empty but meta contains house_id, add:
         # from sqlalchemy import or_, cast, String
-        # stmt = stmt.where(or_(Sensor.owner_id == sub, cast(Sensor.meta['house_id'], String) == house_id))
+        # stmt = stmt.where(or_(Household.house_id == house_id, cast(Sensor.meta['house_id'], String) == house_id))
 
     stmt = stmt.order_by(Sensor.name.asc()).limit(limit).offset(offset)
-    rows = (await db.execute(stmt)).scalars().all()
-    return [to_sensor_out(r) for r in rows]
+    rows = (await db.execute(stmt)).all()
+    return [SensorOut.model_construct(**{**r._mapping, "meta": r.meta or {}}) for r in rows]
 
 
 
 @router.get("/{sensor_id}", response_model=SensorOut)
 async def get_sensor(sensor_id: UUID, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(
-        select(Sensor).options(selectinload(Sensor.household)).where(Sensor.id == sensor_id)
-    )
-    obj = res.scalar_one_or_none()
+    obj = await db.get(Sensor, sensor_id, options=[selectinload(Sensor.household)])
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensor not found")
     return to_sensor_out(obj)
@@ -87,21 +119,27 @@ async def create_sensor(
     house_id: str | None = Query(None),
     householder: str | None = Query(None),
 ):
-    from ..models import Household
-    stmt = None
+    cols = (Household.id, Household.house_id, Household.householder)
     if owner_id is not None:
-        stmt = select(Household).where(Household.id == owner_id)
+        key = ("owner_id", owner_id)
+        stmt = select(*cols).where(Household.id == owner_id)
     elif house_id:
-        stmt = select(Household).where(Household.house_id == house_id)
+        key = ("house_id", house_id)
+        stmt = select(*cols).where(Household.house_id == house_id)
     elif householder:
-        stmt = select(Household).where(Household.householder == householder)
+        key = ("householder", householder)
+        stmt = select(*cols).where(Household.householder == householder)
     else:
         raise HTTPException(status_code=400, detail="one of house_id / owner_id / householder is required")
 
-    res = await db.execute(stmt)
-    hh = res.scalars().first()
-    if not hh:
-        raise HTTPException(status_code=404, detail="Household not found")
+    hh = household_id_cache.get(key)
+    if hh is None:
+        res = await db.execute(stmt)
+        row = res.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Household not found")
+        hh = CachedHousehold(id=row.id, house_id=row.house_id, householder=row.householder)
+        household_id_cache.set(key, hh)
 
     data = payload.model_dump()
     serial = data.get("serial_number")
@@ -115,36 +153,42 @@ async def create_sensor(
     )
     db.add(obj)
     await db.commit()
-    await db.refresh(obj, attribute_names=["household"])
-    return to_sensor_out(obj)
+    # The household is already known, so build the response without reloading the relationship.
+    return to_sensor_out(obj, hh)
 
 
 
 
 @router.patch("/{sensor_id}", response_model=SensorOut)
 async def update_sensor(sensor_id: UUID, payload: dict[str, Any], db: AsyncSession = Depends(get_db)):
-    res = await db.execute(
-        select(Sensor).options(selectinload(Sensor.household)).where(Sensor.id == sensor_id)
-    )
-    obj = res.scalar_one_or_none()
+    obj = await db.get(Sensor, sensor_id, options=[selectinload(Sensor.household)])
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensor not found")
 
+    # Only assign (and later commit) values that actually differ, so no-op patches skip the round trip.
+    dirty = False
+
+    def assign(attr: str, value: Any) -> None:
+        nonlocal dirty
+        if getattr(obj, attr) != value:
+            setattr(obj, attr, value)
+            dirty = True
+
     if "name" in payload and payload["name"] is not None:
-        obj.name = payload["name"]
+        assign("name", payload["name"])
 
     if "type" in payload and payload["type"] is not None:
-        obj.type = payload["type"]
+        assign("type", payload["type"])
     elif "sensor_type" in payload and payload["sensor_type"] is not None:
-        obj.type = payload["sensor_type"]
+        assign("type", payload["sensor_type"])
 
     if "location" in payload and payload["location"] is not None:
-        obj.location = payload["location"]
+        assign("location", payload["location"])
 
     if "metadata" in payload and payload["metadata"] is not None:
-        obj.meta = payload["metadata"]
+        assign("meta", payload["metadata"])
     elif "meta" in payload and payload["meta"] is not None:
-        obj.meta = payload["meta"]
+        assign("meta", payload["meta"])
 
     # Support remotely toggling the "enabled" flag
     if "enabled" in payload:
@@ -154,21 +198,26 @@ async def update_sensor(sensor_id: UUID, payload: dict[str, Any], db: AsyncSessi
         # the database state (and therefore the ingest behaviour) remains
         # unchanged.
         current_meta = obj.meta or {}
-        obj.meta = {**current_meta, "enabled": bool(payload["enabled"])}
-
-    await db.commit()
-    await db.refresh(obj, attribute_names=["household"])
+        enabled = bool(payload["enabled"])
+        if current_meta.get("enabled") is not enabled:
+            obj.meta = {**current_meta, "enabled": enabled}
+            dirty = True
+
+    if dirty:
+        await db.commit()
+        # expire_on_commit=False keeps the selectin-loaded household, so no refresh is needed.
+        sensor_cache.invalidate(obj.id)
     return to_sensor_out(obj)
 
 
 @router.delete("/{sensor_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_sensor(sensor_id: UUID, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(Sensor).where(Sensor.id == sensor_id))
-    obj = res.scalar_one_or_none()
+    obj = await db.get(Sensor, sensor_id)
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensor not found")
     await db.delete(obj)
     await db.commit()
+    sensor_cache.invalidate(sensor_id)
     return
 
 
@@ -179,14 +228,13 @@ async def simulate_sensor(
     period_minutes: int = Query(5, ge=1, le=60),
     profile: str = Query("intermittent"),
     seed: int = 123,
-    ingest_url: str = Query("http://localhost:8000/ingest"),
+    ingest_url: str = Query("http://localhost:8000/ingest/bulk"),
     db: AsyncSession = Depends(get_db),
 ):
     if not HAVE_SIM:
         raise HTTPException(status_code=503, detail="Simulation modules not available")
 
-    res = await db.execute(select(Sensor).where(Sensor.id == sensor_id))
-    sensor = res.scalar_one_or_none()
+    sensor = await db.get(Sensor, sensor_id)
     if not sensor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensor not found")
 
@@ -194,34 +242,39 @@ async def simulate_sensor(
     sim = HomeEnvSim(profile=profile, period_minutes=period_minutes, seed=seed)
     window = sim.generate_window(start, hours=hours)
 
-    sent = 0
-    async with httpx.AsyncClient(timeout=5) as client:
-        for dt, esp in window:
-            value = None
-            attributes = {"ts": dt.isoformat()}
-
-            if isinstance(esp, (int, float)):
-                value = float(esp)
-            elif isinstance(esp, dict):
-                for k in ("value", "temperature", "temp", "humidity", "pm2_5", "co2"):
-                    if k in esp and isinstance(esp[k], (int, float)):
-                        value = float(esp[k])
-                        break
-                attributes["raw"] = esp
-            else:
-                attributes["raw"] = str(esp)
-
-            if value is None:
-                continue
-
-            payload = {"sensor_id": str(sensor.id), "value": value, "attributes": attributes}
-            try:
-                r = await client.post(ingest_url, json=payload)
-                if r.status_code >= 300:
-                    print(f"[WARN] ingest failed {r.status_code}: {r.text}")
-                else:
-                    sent += 1
-            except httpx.RequestError as e:
-                print(f"[ERROR] HTTP error posting ingest: {e}")
-
-    return {"ok": True, "sent": sent}
+    payloads = []
+    for dt, esp in window:
+        value = None
+        attributes = {"ts": dt.isoformat()}
+
+        if isinstance(esp, (int, float)):
+            value = float(esp)
+        elif isinstance(esp, dict):
+            value = next((float(esp[k]) for k in _VALUE_KEYS if isinstance(esp.get(k), (int, float))), None)
+            attributes["raw"] = esp
+        else:
+            attributes["raw"] = str(esp)
+
+        if value is None:
+            continue
+
+        payloads.append({"sensor_id": str(sensor.id), "value": value, "attributes": attributes})
+
+    if not payloads:
+        return {"ok": True, "sent": 0}
+
+    # The whole window goes out as one list body: a single round trip and a single
+    # insert on the server. /ingest accepts the same body, so either URL works.
+    try:
+        r = await _simulation_ingest_client().post(ingest_url, json=payloads, timeout=30)
+    except httpx.RequestError as e:
+        print(f"[ERROR] HTTP error posting ingest: {e}")
+        return {"ok": True, "sent": 0}
+    if r.status_code >= 300:
+        print(f"[WARN] ingest failed {r.status_code}: {r.text}")
+        return {"ok": True, "sent": 0}
+
+    if r.status_code == status.HTTP_204_NO_CONTENT:
+        # Plain /ingest answers without a body; report what was posted.
+        return {"ok": True, "sent": len(payloads)}
+    return {"ok": True, "sent": r.json().get("inserted", 0)}
@@ -0,0 +1,158 @@
+"""In-process TTL cache of the sensor metadata needed on the ingest hot path."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from itertools import islice
+from dataclasses import dataclass
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Household, Sensor
+
+
+def _meta_enabled(meta: object) -> bool:
+    """Interpret ``meta["enabled"]``; sensors without the flag are enabled."""
+
+    if not isinstance(meta, dict) or "enabled" not in meta:
+        return True
+    value = meta["enabled"]
+    if isinstance(value, str):
+        return value.strip().lower() not in {"false", "0", "off", "no"}
+    return bool(value)
+
+
+@dataclass(frozen=True, slots=True)
+class CachedSensor:
+    """Detached snapshot of a sensor row and its owner's contact e-mail."""
+
+    id: UUID
+    name: str | None
+    type: str | None
+    serial_number: str | None
+    meta: dict | None
+    owner_id: int | None
+    owner_email: str | None
+    enabled: bool
+
+
+class SensorCache:
+    """Map sensor ids to :class:`CachedSensor` entries for ``ttl`` seconds.
+
+    Misses are loaded with a single query joined to the owning household.
+    Concurrent requests missing the same sensor wait on a per-key lock so only
+    one of them reaches the database. Unknown ids are cached as absent too;
+    sensor ids are generated server-side, so a new sensor never collides with
+    a previously missed id. At most ``max_entries`` ids are kept; expired
+    entries are dropped first, then the oldest live ones.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[UUID, tuple[float, CachedSensor | None]] = {}
+        self._locks: dict[UUID, asyncio.Lock] = {}
+        # Requests holding or waiting on each lock in _locks.
+        self._lock_users: dict[UUID, int] = {}
+
+    def _fresh(self, sensor_ids: Iterable[UUID], now: float) -> dict[UUID, CachedSensor | None]:
+        found: dict[UUID, CachedSensor | None] = {}
+        for sensor_id in sensor_ids:
+            entry = self._entries.get(sensor_id)
+            if entry is not None and entry[0] > now:
+                found[sensor_id] = entry[1]
+        return found
+
+    async def get_many(self, db: AsyncSession, sensor_ids: Iterable[UUID]) -> dict[UUID, CachedSensor]:
+        wanted = set(sensor_ids)
+        found = self._fresh(wanted, time.monotonic())
+        missing = sorted(wanted - found.keys())
+        if not missing:
+            return {k: v for k, v in found.items() if v is not None}
+
+        registered: list[UUID] = []
+        acquired: list[asyncio.Lock] = []
+        try:
+            # Sorted acquisition keeps overlapping batches from deadlocking.
+            for sensor_id in missing:
+                lock = self._locks.get(sensor_id)
+                if lock is None:
+                    lock = self._locks[sensor_id] = asyncio.Lock()
+                self._lock_users[sensor_id] = self._lock_users.get(sensor_id, 0) + 1
+                registered.append(sensor_id)
+                await lock.acquire()
+                acquired.append(lock)
+
+            # Another request may have filled some entries while we waited.
+            found.update(self._fresh(missing, time.monotonic()))
+            to_load = [sensor_id for sensor_id in missing if sensor_id not in found]
+            if to_load:
+                loaded = await self._load(db, to_load)
+                now = time.monotonic()
+                self._make_room(len(to_load), now)
+                expires = now + self.ttl
+                for sensor_id in to_load:
+                    cached = loaded.get(sensor_id)
+                    self._entries[sensor_id] = (expires, cached)
+                    found[sensor_id] = cached
+        finally:
+            for lock in acquired:
+                lock.release()
+            # Drop a lock only once nobody holds or waits on it. Removing it earlier
+            # would let a newcomer create a second lock and load the same ids again.
+            # This also runs when _load fails, so failed lookups leave nothing behind.
+            for sensor_id in registered:
+                users = self._lock_users[sensor_id] - 1
+                if users:
+                    self._lock_users[sensor_id] = users
+                else:
+                    del self._lock_users[sensor_id]
+                    del self._locks[sensor_id]
+
+        return {k: v for k, v in found.items() if v is not None}
+
+    def _make_room(self, incoming: int, now: float) -> None:
+        if len(self._entries) + incoming <= self.max_entries:
+            return
+        self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+        excess = len(self._entries) + incoming - self.max_entries
+        if excess > 0:
+            # Still full of live entries: evict the oldest insertions, plus a tenth of
+            # the capacity so the next misses do not rebuild the dict again right away.
+            excess = min(len(self._entries), excess + self.max_entries // 10)
+            for key in list(islice(self._entries, excess)):
+                del self._entries[key]
+
+    async def _load(self, db: AsyncSession, sensor_ids: list[UUID]) -> dict[UUID, CachedSensor]:
+        stmt = (
+            select(Sensor, Household.email)
+            .outerjoin(Household, Household.id == Sensor.owner_id)
+            .where(Sensor.id.in_(sensor_ids))
+        )
+        rows = await db.execute(stmt)
+        loaded: dict[UUID, CachedSensor] = {}
+        for sensor, email in rows.all():
+            loaded[sensor.id] = CachedSensor(
+                id=sensor.id,
+                name=sensor.name,
+                type=sensor.type,
+                serial_number=sensor.serial_number,
+                meta=sensor.meta,
+                owner_id=sensor.owner_id,
+                owner_email=(email or "").strip() or None,
+                enabled=_meta_enabled(sensor.meta),
+            )
+        return loaded
+
+    def invalidate(self, sensor_id: UUID) -> None:
+        self._entries.pop(sensor_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+sensor_cache = SensorCache()
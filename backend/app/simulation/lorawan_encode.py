@@ -3,6 +3,7 @@
 
 from __future__ import annotations
 import struct
+from typing import Sequence
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -24,15 +25,15 @@ FIELDS = [
 ]
 IDX = {f.name: i for i, f in enumerate(FIELDS)}
 
-def _clip(name: str, v: float) -> float:
-    f = FIELDS[IDX[name]]
-    return max(f.lo, min(f.hi, v))
+_STRUCT = struct.Struct(">Hh" + "H" * (len(FIELDS) - 2))
+PAYLOAD_SIZE = _STRUCT.size
 
-def _to_int(v: float, spec: FieldSpec) -> int:
-    scaled = round(v * spec.scale)
-    if spec.signed:
-        return max(-32768, min(32767, int(scaled)))
-    return max(0, min(65535, int(scaled)))
+# (name, lo, hi, scale) per field in payload order. Clipping to [lo, hi] already keeps
+# every scaled value inside its 16-bit slot; lux's hi is lowered to the uint16 ceiling.
+_PACK_SPECS = tuple(
+    (f.name, float(f.lo), min(float(f.hi), 65535.0) if f.name == "lux" else float(f.hi), f.scale)
+    for f in FIELDS
+)
 
 def encode_lorawan(esp: dict) -> bytes:
     """
@@ -41,17 +42,24 @@ def encode_lorawan(esp: dict) -> bytes:
       [pm25 u16][noise u16][no2 u16][lux u16][bat u16]
     Lux is saturated to 65535 at packing time (sensor may read up to 88000).
     """
-    ints = []
-    for spec in FIELDS:
-        raw = esp[spec.name]
-        if spec.name != "serial":
-            raw = _clip(spec.name, float(raw))
-            if spec.name == "lux":  # LoRaWAN uint16 ceiling
-                raw = min(raw, 65535.0)
-        ints.append(_to_int(raw, spec))
-
-    fmt = ">Hh" + "H" * (len(FIELDS) - 2)
-    return struct.pack(fmt, ints[0], ints[1], *ints[2:])
+    return _STRUCT.pack(
+        *[round(max(lo, min(hi, float(esp[name]))) * scale) for name, lo, hi, scale in _PACK_SPECS]
+    )
+
+def encode_lorawan_batch(readings: Sequence[dict]) -> bytes:
+    """
+    Encode many ESP reads into one contiguous buffer of PAYLOAD_SIZE-byte
+    records, in input order; record i equals encode_lorawan(readings[i]).
+    """
+    buf = bytearray(PAYLOAD_SIZE * len(readings))
+    pack_into = _STRUCT.pack_into
+    for offset, esp in zip(range(0, len(buf), PAYLOAD_SIZE), readings):
+        pack_into(
+            buf,
+            offset,
+            *[round(max(lo, min(hi, float(esp[name]))) * scale) for name, lo, hi, scale in _PACK_SPECS],
+        )
+    return bytes(buf)
 
 def to_hex(payload: bytes) -> str:
     return payload.hex().upper()
@@ -1,7 +1,10 @@
 import re
 
+_NON_ALPHA = re.compile(r"[^A-Za-z]+")
+_NON_DIGIT = re.compile(r"\D")
+
 def _normalize_name(s: str) -> str:
-    return re.sub(r"[^A-Za-z]+", "", s or "").upper()
+    return _NON_ALPHA.sub("", s or "").upper()
 
 def build_house_id(zone: str, first_name: str, last_name: str, serial_number: str) -> str:
     zone_ = (zone or "").strip().upper()
@@ -9,6 +12,6 @@ def build_house_id(zone: str, first_name: str, last_name: str, serial_number: st
     ln = _normalize_name(last_name)
     fn1 = (fn[:1] or "X")
     ln3 = (ln[:3] or "XXX").ljust(3, "X")
-    digits = re.sub(r"\D", "", serial_number or "")
+    digits = _NON_DIGIT.sub("", serial_number or "")
     tail3 = digits[-3:].rjust(3, "0")
     return f"{zone_}{fn1}{ln3}{tail3}"
@@ -1,5 +1,6 @@
 import asyncio
-from typing import Set
+from typing import Optional, Set
+import orjson
 from fastapi import WebSocket
 
 class Broadcaster:
@@ -17,13 +18,22 @@ class Broadcaster:
             self.clients.discard(ws)
 
     async def broadcast_json(self, payload: dict):
-        stale = []
-        for ws in list(self.clients):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                stale.append(ws)
-        for ws in stale:
-            await self.disconnect(ws)
+        # Send to every client concurrently so one slow socket doesn't hold up the rest.
+        # Encode once for all clients instead of once per send_json call.
+        text = orjson.dumps(payload).decode()
+        clients = list(self.clients)
+        results = await asyncio.gather(*(_safe_send(ws, text) for ws in clients))
+        for ws in results:
+            if ws is not None:
+                await self.disconnect(ws)
+
+
+async def _safe_send(ws: WebSocket, text: str) -> Optional[WebSocket]:
+    """Send *text* to *ws*, returning the socket if it failed and should be dropped."""
+    try:
+        await ws.send_text(text)
+    except Exception:
+        return ws
+    return None
 
 broadcaster = Broadcaster()
@@ -38,3 +38,11 @@ def test_get_admin_recipients_falls_back_to_smtp_recipients(monkeypatch):
         "general@example.com",
         "second@example.com",
     ]
+
+
+def test_has_default_recipients_follows_the_environment(monkeypatch):
+    monkeypatch.setenv("SMTP_TO", "")
+    assert alerting.has_default_recipients() is False
+
+    monkeypatch.setenv("SMTP_TO", "general@example.com")
+    assert alerting.has_default_recipients() is True
@@ -0,0 +1,134 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.routers import analytics
+
+
+SENSOR_ID = UUID("00000000-0000-0000-0000-000000000001")
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeStreamResult:
+    def __init__(self, rows):
+        self._rows = list(rows)
+
+    async def partitions(self, size):
+        for i in range(0, len(self._rows), size):
+            yield self._rows[i : i + size]
+
+
+class FakeSession:
+    """Serves ``db.stream`` from canned rows, as Postgres would after ``ORDER BY ts``."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def stream(self, stmt):
+        self.statements.append(stmt)
+        return FakeStreamResult(self.rows)
+
+
+def _sql(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect()))
+
+
+def _readings(minutes):
+    return [("temperature", START + timedelta(minutes=m), 20.0 + m) for m in minutes]
+
+
+def test_load_metric_series_many_orders_by_timestamp():
+    db = FakeSession(_readings([0, 7, 14, 21, 33]))
+
+    series = asyncio.run(
+        analytics._load_metric_series_many(
+            db,
+            serial=None,
+            sensor_ids=[SENSOR_ID],
+            metrics=("temp",),
+            start_ts=START,
+            end_ts=START + timedelta(hours=1),
+            start_bound=START,
+            end_bound=START + timedelta(hours=1),
+            interval=timedelta(minutes=5),
+            agg="avg",
+        )
+    )
+
+    # metric_timeseries relies on the query ordering to emit labels in ascending order.
+    assert _sql(db.statements[0]).endswith("ORDER BY sensor_readings.ts ASC")
+    keys = list(series["temp"])
+    assert keys == sorted(keys)
+    assert len(keys) == 5
+
+
+def test_metric_timeseries_labels_ascend():
+    db = FakeSession(_readings([2, 9, 16, 23, 31, 44]))
+    payload = {
+        "sensor_id": str(SENSOR_ID),
+        "metric": "temp",
+        "start_ts": "2024-01-01T00:00:00Z",
+        "end_ts": "2024-01-01T01:00:00Z",
+        "interval": "5m",
+    }
+
+    out = asyncio.run(analytics.metric_timeseries(payload, db))
+
+    assert out["labels"] == sorted(out["labels"])
+    assert out["series"][0]["data"] == [22.0, 29.0, 36.0, 43.0, 51.0, 64.0]
+
+
+def test_reading_filter_ids_only():
+    clause = analytics._build_reading_filter(None, [SENSOR_ID])
+
+    assert _sql(clause) == "sensors.id IN (__[POSTCOMPILE_id_1])"
+
+
+def test_reading_filter_serial_only():
+    clause = analytics._build_reading_filter("SN-Box", [])
+
+    sql = _sql(clause)
+    assert sql == _sql(analytics._build_serial_join_clause("SN-Box"))
+    assert "sensors.id IN" not in sql
+    assert " AND " not in sql
+    assert "sn-box" in clause.compile(dialect=postgresql.dialect()).params.values()
+
+
+def test_reading_filter_ids_and_serial_form_one_disjunction():
+    clause = analytics._build_reading_filter("SN-Box", [SENSOR_ID])
+
+    sql = _sql(clause)
+    serial_sql = _sql(analytics._build_serial_join_clause("SN-Box"))
+    # Rows matching only the serial must survive, so the id list is OR'ed, never AND'ed.
+    assert sql == f"sensors.id IN (__[POSTCOMPILE_id_1]) OR {serial_sql}"
+
+
+def test_reading_filter_without_reference_is_none():
+    assert analytics._build_reading_filter(None, []) is None
+
+
+@pytest.mark.parametrize("raw", ["0s", "0m", "-5m", "-1h"])
+def test_parse_interval_rejects_non_positive_steps(raw):
+    with pytest.raises(ValueError, match="bad interval"):
+        analytics._parse_interval(raw)
+
+
+def test_metric_timeseries_zero_interval_is_a_bad_interval_not_a_division_error():
+    payload = {
+        "sensor_id": str(SENSOR_ID),
+        "metric": "temp",
+        "start_ts": "2024-01-01T00:00:00Z",
+        "end_ts": "2024-01-01T01:00:00Z",
+        "interval": "0m",
+    }
+
+    with pytest.raises(ValueError, match="bad interval"):
+        asyncio.run(analytics.metric_timeseries(payload, FakeSession([])))
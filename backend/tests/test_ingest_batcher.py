@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import ingest_batcher as batcher_module
+from app.ingest_batcher import IngestBatcher
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def commit(self):
+        self.log.append("commit")
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Record every COPY the batcher issues instead of touching the database."""
+
+    log: list = []
+
+    async def fake_copy(session, rows):
+        log.append(list(rows))
+
+    monkeypatch.setattr(batcher_module, "IngestSessionLocal", lambda: FakeSession(log))
+    monkeypatch.setattr(batcher_module, "copy_readings", fake_copy)
+    return log
+
+
+def _rows(*values):
+    return [{"sensor_id": "s", "value": v, "attributes": {}} for v in values]
+
+
+def test_flushes_once_max_rows_are_queued(writes):
+    async def scenario():
+        batcher = IngestBatcher(max_rows=3, max_latency=60)
+        await batcher.start()
+        # Would hang for max_latency if the size limit did not trigger the flush.
+        await asyncio.wait_for(
+            asyncio.gather(batcher.submit(_rows(1, 2)), batcher.submit(_rows(3))),
+            timeout=1,
+        )
+        await batcher.stop()
+
+    asyncio.run(scenario())
+
+    assert writes == [_rows(1, 2, 3), "commit"]
+
+
+def test_flushes_after_max_latency(writes):
+    async def scenario():
+        batcher = IngestBatcher(max_rows=1000, max_latency=0.05)
+        await batcher.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(batcher.submit(_rows(1)), batcher.submit(_rows(2)))
+        elapsed = loop.time() - started
+        await batcher.stop()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+
+    assert writes == [_rows(1, 2), "commit"]
+    assert 0.04 <= elapsed < 1
+
+
+def test_stop_flushes_pending_rows(writes):
+    async def scenario():
+        batcher = IngestBatcher(max_rows=1000, max_latency=60)
+        await batcher.start()
+        pending = asyncio.create_task(batcher.submit(_rows(1)))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(batcher.stop(), timeout=1)
+        await pending
+        return batcher.running
+
+    running = asyncio.run(scenario())
+
+    assert writes == [_rows(1), "commit"]
+    assert running is False
+
+
+def test_write_error_reaches_every_caller(monkeypatch, writes):
+    async def failing_copy(session, rows):
+        raise RuntimeError("copy failed")
+
+    monkeypatch.setattr(batcher_module, "copy_readings", failing_copy)
+
+    async def scenario():
+        batcher = IngestBatcher(max_rows=1000, max_latency=0.01)
+        await batcher.start()
+        results = await asyncio.gather(
+            batcher.submit(_rows(1)),
+            batcher.submit(_rows(2)),
+            return_exceptions=True,
+        )
+        # The background task survives a failed batch and keeps serving.
+        monkeypatch.setattr(batcher_module, "copy_readings", lambda session, rows: asyncio.sleep(0))
+        await batcher.submit(_rows(3))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [str(r) for r in results] == ["copy failed", "copy failed"]
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert writes == ["commit"]
+
+
+def test_bad_submission_does_not_fail_the_rest_of_the_batch(monkeypatch, writes):
+    async def copy_rejecting_bad_rows(session, rows):
+        if any(row["value"] == "bad" for row in rows):
+            raise RuntimeError("foreign key violation")
+        writes.append(list(rows))
+
+    monkeypatch.setattr(batcher_module, "copy_readings", copy_rejecting_bad_rows)
+
+    async def scenario():
+        batcher = IngestBatcher(max_rows=1000, max_latency=0.05)
+        await batcher.start()
+        results = await asyncio.gather(
+            batcher.submit(_rows(1, 2)),
+            batcher.submit(_rows("bad")),
+            batcher.submit(_rows(3)),
+            return_exceptions=True,
+        )
+        await batcher.stop()
+        return results
+
+    ok_first, failed, ok_last = asyncio.run(scenario())
+
+    assert ok_first is None and ok_last is None
+    assert isinstance(failed, RuntimeError)
+    # The merged COPY failed, then each submission was written on its own.
+    assert writes == [_rows(1, 2), "commit", _rows(3), "commit"]
+
+
+def test_submit_requires_running_batcher():
+    with pytest.raises(RuntimeError):
+        asyncio.run(IngestBatcher().submit(_rows(1)))
+
+
+def test_ingest_releases_lookup_connection_before_waiting_on_batcher(monkeypatch):
+    from uuid import UUID
+
+    from app.routers import ingest
+    from app.sensor_cache import CachedSensor
+
+    sensor_id = UUID("00000000-0000-0000-0000-000000000001")
+    events: list[str] = []
+
+    class LookupSession:
+        async def rollback(self):
+            events.append("rollback")
+
+    async def fake_get_many(db, ids):
+        events.append("lookup")
+        return {
+            sensor_id: CachedSensor(
+                id=sensor_id,
+                name="t",
+                type="temperature",
+                serial_number=None,
+                meta={},
+                owner_id=None,
+                owner_email=None,
+                enabled=True,
+            )
+        }
+
+    class RunningBatcher:
+        running = True
+
+        async def submit(self, rows):
+            events.append("submit")
+
+    async def no_alerts(events):
+        return None
+
+    monkeypatch.setattr(ingest.sensor_cache, "get_many", fake_get_many)
+    monkeypatch.setattr(ingest, "ingest_batcher", RunningBatcher())
+    monkeypatch.setattr(ingest, "dispatch_alerts", no_alerts)
+
+    written = asyncio.run(
+        ingest._ingest_rows(LookupSession(), [{"sensor_id": str(sensor_id), "value": 21.5}])
+    )
+
+    assert written == 1
+    assert events == ["lookup", "rollback", "submit"]
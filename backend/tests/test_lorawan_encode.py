@@ -0,0 +1,81 @@
+import random
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.simulation import lorawan_encode as enc
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _reading(rng: random.Random, spread: float = 1.0) -> dict:
+    """Random ESP read; spread > 1 pushes values outside each field's range."""
+
+    esp = {}
+    for f in enc.FIELDS:
+        mid = (f.lo + f.hi) / 2
+        half = (f.hi - f.lo) / 2 * spread
+        esp[f.name] = rng.uniform(mid - half, mid + half)
+    esp["serial"] = rng.randrange(0, 65536)
+    return esp
+
+
+def _fields(payload: bytes) -> dict:
+    return dict(zip((f.name for f in enc.FIELDS), struct.unpack(">Hh" + "H" * 9, payload)))
+
+
+def test_batch_matches_concatenated_single_encodes():
+    rng = random.Random(1234)
+    readings = [_reading(rng, spread=1.5) for _ in range(2000)]
+    readings += [
+        {f.name: f.lo for f in enc.FIELDS},
+        {f.name: f.hi for f in enc.FIELDS},
+        {**{f.name: f.hi * 10 for f in enc.FIELDS}, "serial": 1},
+        {**{f.name: f.lo - 1000 for f in enc.FIELDS}, "serial": 0},
+    ]
+
+    batch = enc.encode_lorawan_batch(readings)
+
+    assert len(batch) == enc.PAYLOAD_SIZE * len(readings)
+    assert batch == b"".join(enc.encode_lorawan(esp) for esp in readings)
+
+
+def test_batch_of_nothing_is_empty():
+    assert enc.encode_lorawan_batch([]) == b""
+
+
+def test_out_of_range_values_are_clipped_to_the_field_bounds():
+    low = {**{f.name: f.lo - 1000 for f in enc.FIELDS}, "serial": 7}
+    high = {**{f.name: f.hi + 1000 for f in enc.FIELDS}, "serial": 7}
+
+    lows, highs = _fields(enc.encode_lorawan(low)), _fields(enc.encode_lorawan(high))
+
+    assert lows["temp_c"] == -4000
+    assert lows["co2_ppm"] == 400
+    assert lows["bat_mv"] == 3200
+    assert highs["temp_c"] == 8500
+    assert highs["rh_pct"] == 10000
+    assert highs["noise_dba"] == 1300
+
+
+def test_lux_saturates_at_uint16_ceiling():
+    base = {f.name: f.lo for f in enc.FIELDS}
+
+    for lux, expected in ((65534.6, 65535), (65535.0, 65535), (70000.0, 65535), (88000.0, 65535), (123.4, 123)):
+        payload = enc.encode_lorawan({**base, "lux": lux})
+        assert _fields(payload)["lux"] == expected
+        assert enc.encode_lorawan_batch([{**base, "lux": lux}]) == payload
+
+
+def test_simulator_and_backend_copies_match():
+    simulator_path = REPO_ROOT / "Simulation" / "lorawan_encode.py"
+    if not simulator_path.exists():
+        pytest.skip("simulator sources are not part of this checkout")
+    simulator = simulator_path.read_text(encoding="utf-8")
+    backend = (REPO_ROOT / "backend" / "app" / "simulation" / "lorawan_encode.py").read_text(encoding="utf-8")
+
+    assert simulator == backend
@@ -0,0 +1,108 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import UUID
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.deps import get_db
+from app.routers import readings
+
+SENSOR_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+
+class FakeStreamResult:
+    def __init__(self, partitions):
+        self._partitions = partitions
+
+    async def partitions(self, size):
+        for partition in self._partitions:
+            yield partition
+
+
+class FakeSession:
+    def __init__(self, partitions=(), error=None):
+        self.partitions = list(partitions)
+        self.error = error
+        self.statements = []
+
+    async def stream_scalars(self, stmt):
+        self.statements.append(stmt)
+        if self.error is not None:
+            raise self.error
+        return FakeStreamResult(self.partitions)
+
+
+def _reading(i):
+    return SimpleNamespace(
+        id=i,
+        sensor_id=SENSOR_ID,
+        ts=datetime(2024, 1, 1, 0, i, tzinfo=timezone.utc),
+        value=20.0 + i,
+        attributes={"i": i} if i % 2 else None,
+    )
+
+
+def _client(session):
+    closed = []
+
+    async def override_get_db():
+        try:
+            yield session
+        finally:
+            closed.append(True)
+
+    app = FastAPI()
+    app.include_router(readings.router)
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app, raise_server_exceptions=False), closed
+
+
+def test_export_streams_every_partition_through_get_db():
+    session = FakeSession(partitions=[[_reading(1), _reading(2)], [_reading(3)]])
+    client, closed = _client(session)
+
+    r = client.get("/api/readings/export", params={"sensor_id": str(SENSOR_ID)})
+
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == f'attachment; filename="sensor_{SENSOR_ID}_readings.csv"'
+    lines = r.text.splitlines()
+    assert lines[0] == "id,sensor_id,timestamp,value,attributes"
+    assert [line.split(",")[0] for line in lines[1:]] == ["1", "2", "3"]
+    assert lines[1].endswith('"{""i"":1}"')
+    assert len(session.statements) == 1
+    assert closed == [True]
+
+
+def test_export_without_rows_is_just_the_header():
+    client, closed = _client(FakeSession())
+
+    r = client.get("/api/readings/export", params={"sensor_id": str(SENSOR_ID)})
+
+    assert r.status_code == 200
+    assert r.text.splitlines() == ["id,sensor_id,timestamp,value,attributes"]
+    assert closed == [True]
+
+
+def test_export_rejects_invalid_sensor_id_before_querying():
+    session = FakeSession()
+    client, _ = _client(session)
+
+    r = client.get("/api/readings/export", params={"sensor_id": "not-a-uuid"})
+
+    assert r.status_code == 422
+    assert session.statements == []
+
+
+def test_export_query_error_is_an_error_response_not_a_truncated_csv():
+    client, closed = _client(FakeSession(error=RuntimeError("database unavailable")))
+
+    r = client.get("/api/readings/export", params={"sensor_id": str(SENSOR_ID)})
+
+    assert r.status_code == 500
+    assert "content-disposition" not in r.headers
+    assert closed == [True]
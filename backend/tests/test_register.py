@@ -30,7 +30,20 @@ def _depends(dep):
     return dep
 
 
+class _BackgroundTasks:
+    def __init__(self):
+        self.tasks = []
+
+    def add_task(self, func, *args, **kwargs):
+        self.tasks.append((func, args, kwargs))
+
+    async def run(self):
+        for func, args, kwargs in self.tasks:
+            await func(*args, **kwargs)
+
+
 fastapi_stub.APIRouter = _APIRouter
+fastapi_stub.BackgroundTasks = _BackgroundTasks
 fastapi_stub.Depends = _depends
 fastapi_stub.HTTPException = _HTTPException
 fastapi_stub.status = types.SimpleNamespace(
@@ -41,7 +54,6 @@ fastapi_stub.status = types.SimpleNamespace(
     HTTP_500_INTERNAL_SERVER_ERROR=500,
 )
 
-sys.modules.setdefault("fastapi", fastapi_stub)
 
 httpx_stub = types.ModuleType("httpx")
 
@@ -88,7 +100,6 @@ class _Response:
 
 httpx_stub.Response = _Response
 
-sys.modules.setdefault("httpx", httpx_stub)
 
 sqlalchemy_stub = types.ModuleType("sqlalchemy")
 
@@ -105,7 +116,30 @@ def _select(*args, **kwargs):
     return _Select(*args, **kwargs)
 
 
+def _or(*clauses):
+    return clauses
+
+
+class _Insert:
+    def __init__(self, table):
+        self.table = table
+        self.params = {}
+
+    def values(self, **kwargs):
+        self.params.update(kwargs)
+        return self
+
+    def returning(self, *cols):
+        return self
+
+
+def _insert(table):
+    return _Insert(table)
+
+
 sqlalchemy_stub.select = _select
+sqlalchemy_stub.insert = _insert
+sqlalchemy_stub.or_ = _or
 sqlalchemy_ext_stub = types.ModuleType("sqlalchemy.ext")
 sqlalchemy_ext_asyncio_stub = types.ModuleType("sqlalchemy.ext.asyncio")
 
@@ -117,9 +151,6 @@ class _AsyncSession:
 sqlalchemy_ext_asyncio_stub.AsyncSession = _AsyncSession
 sqlalchemy_stub.ext = types.SimpleNamespace(asyncio=sqlalchemy_ext_asyncio_stub)
 
-sys.modules.setdefault("sqlalchemy", sqlalchemy_stub)
-sys.modules.setdefault("sqlalchemy.ext", sqlalchemy_ext_stub)
-sys.modules.setdefault("sqlalchemy.ext.asyncio", sqlalchemy_ext_asyncio_stub)
 
 app_alerting_stub = types.ModuleType("app.alerting")
 
@@ -162,6 +193,7 @@ class _Column:
 
 
 class _Household:
+    id = _Column("id")
     serial_number = _Column("serial_number")
     house_id = _Column("house_id")
 
@@ -172,6 +204,22 @@ class _Household:
 
 app_models_stub.Household = _Household
 
+app_sensor_cache_stub = types.ModuleType("app.sensor_cache")
+
+
+class _SensorCache:
+    def __init__(self):
+        self.cleared = 0
+
+    def clear(self):
+        self.cleared += 1
+
+
+app_sensor_cache_stub.sensor_cache = _SensorCache()
+
+app_household_cache_stub = types.ModuleType("app.household_cache")
+app_household_cache_stub.household_id_cache = _SensorCache()
+
 app_db_stub = types.ModuleType("app.db")
 
 
@@ -181,37 +229,87 @@ def _get_db():
 
 app_db_stub.get_db = _get_db
 
-sys.modules.setdefault("app.alerting", app_alerting_stub)
-sys.modules.setdefault("app.schemas", app_schemas_stub)
-sys.modules.setdefault("app.models", app_models_stub)
-sys.modules.setdefault("app.db", app_db_stub)
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from app.routers import register as register_module  # noqa: E402
+_STUBS = {
+    "fastapi": fastapi_stub,
+    "httpx": httpx_stub,
+    "sqlalchemy": sqlalchemy_stub,
+    "sqlalchemy.ext": sqlalchemy_ext_stub,
+    "sqlalchemy.ext.asyncio": sqlalchemy_ext_asyncio_stub,
+    "app.alerting": app_alerting_stub,
+    "app.schemas": app_schemas_stub,
+    "app.models": app_models_stub,
+    "app.db": app_db_stub,
+    "app.sensor_cache": app_sensor_cache_stub,
+    "app.household_cache": app_household_cache_stub,
+}
+
+
+def _import_register_with_stubs():
+    """Import the register router against the stubs, then restore sys.modules.
+
+    The stubs are only visible while the router is imported, so other test
+    modules get the real packages whichever order they are collected in.
+    """
+
+    import app.routers as routers_pkg
+
+    saved = {name: sys.modules.get(name) for name in (*_STUBS, "app.routers.register")}
+    saved_attr = routers_pkg.__dict__.pop("register", None)
+    sys.modules.update(_STUBS)
+    sys.modules.pop("app.routers.register", None)
+    try:
+        from app.routers import register
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        if saved_attr is None:
+            routers_pkg.__dict__.pop("register", None)
+        else:
+            routers_pkg.register = saved_attr
+    return register
+
+
+register_module = _import_register_with_stubs()
 
 
 class DummyResult:
+    def __init__(self, rows=()):
+        self._rows = list(rows)
+
     def scalars(self):
         return self
 
     def first(self):
-        return None
+        return self._rows[0] if self._rows else None
+
+    def all(self):
+        return list(self._rows)
+
+    def scalar_one(self):
+        (row,) = self._rows
+        return row
 
 
 class DummySession:
-    def __init__(self):
+    def __init__(self, existing=()):
         self.added = []
         self.committed = False
         self.rolled_back = False
         self.queries = []
+        self.existing = list(existing)
 
     async def execute(self, query):
         self.queries.append(query)
-        return DummyResult()
-
-    def add(self, obj):
-        self.added.append(obj)
+        if isinstance(query, _Insert):
+            self.added.append(query.params)
+            return DummyResult([len(self.added)])
+        return DummyResult(self.existing)
 
     async def commit(self):
         self.committed = True
@@ -275,12 +373,20 @@ def test_register_updates_simulation(monkeypatch):
         }
 
     monkeypatch.setattr(register_module, "_update_simulation_registration", fake_update)
+    cleared_before = register_module.sensor_cache.cleared
+    households_cleared_before = register_module.household_id_cache.cleared
+    background = _BackgroundTasks()
 
-    result = asyncio.run(register_module.register(data, session))
+    result = asyncio.run(register_module.register(data, background, session))
 
     assert result.house_id
+    assert [row["house_id"] for row in session.added] == [result.house_id]
     assert session.committed is True
+    assert register_module.sensor_cache.cleared == cleared_before + 1
+    assert register_module.household_id_cache.cleared == households_cleared_before + 1
     assert session.rolled_back is False
+    assert not email_calls, "Expected the email notification to be deferred"
+    asyncio.run(background.run())
     assert email_calls, "Expected registration to send an email notification"
     assert calls == [(data.serial_number, result.house_id, True)]
 
@@ -296,13 +402,29 @@ def test_register_rejects_unknown_serial(monkeypatch):
     monkeypatch.setattr(register_module, "send_simple_email", pytest.fail)
 
     with pytest.raises(register_module.HTTPException) as excinfo:
-        asyncio.run(register_module.register(data, session))
+        asyncio.run(register_module.register(data, _BackgroundTasks(), session))
 
     assert excinfo.value.status_code == 422
     assert session.committed is False
     assert session.rolled_back is False
 
 
+def test_register_checks_duplicates_in_single_query(monkeypatch):
+    data = _make_default_register_data()
+    session = DummySession(
+        existing=[types.SimpleNamespace(serial_number=data.serial_number, house_id="OTHER")]
+    )
+
+    monkeypatch.setattr(register_module, "_update_simulation_registration", pytest.fail)
+
+    with pytest.raises(register_module.HTTPException) as excinfo:
+        asyncio.run(register_module.register(data, _BackgroundTasks(), session))
+
+    assert excinfo.value.status_code == 409
+    assert excinfo.value.detail == "Serial number already exists"
+    assert len(session.queries) == 1
+
+
 def test_register_rolls_back_simulation_on_commit_failure(monkeypatch):
     calls: list[tuple] = []
 
@@ -323,7 +445,7 @@ def test_register_rolls_back_simulation_on_commit_failure(monkeypatch):
     data = _make_default_register_data()
 
     with pytest.raises(RuntimeError):
-        asyncio.run(register_module.register(data, session))
+        asyncio.run(register_module.register(data, _BackgroundTasks(), session))
 
     assert len(calls) == 2
     first_call, second_call = calls
@@ -0,0 +1,167 @@
+import asyncio
+import sys
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.sensor_cache import CachedSensor, SensorCache
+
+KNOWN = UUID("00000000-0000-0000-0000-000000000001")
+UNKNOWN = UUID("00000000-0000-0000-0000-000000000002")
+
+
+def _cached(sensor_id: UUID) -> CachedSensor:
+    return CachedSensor(
+        id=sensor_id,
+        name="Living room",
+        type="temperature",
+        serial_number="SN1",
+        meta={},
+        owner_id=1,
+        owner_email="owner@example.com",
+        enabled=True,
+    )
+
+
+class CountingCache(SensorCache):
+    """Replace the database query with canned rows and count the loads."""
+
+    def __init__(self, rows=(KNOWN,), **kwargs):
+        super().__init__(**kwargs)
+        self.rows = set(rows)
+        self.loads: list[list[UUID]] = []
+        self.fail = False
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _load(self, db, sensor_ids):
+        self.loads.append(list(sensor_ids))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Yield so concurrent callers pile up on the per-key locks.
+            await asyncio.sleep(0.01)
+            if self.fail:
+                raise RuntimeError("database unavailable")
+            return {sid: _cached(sid) for sid in sensor_ids if sid in self.rows}
+        finally:
+            self.in_flight -= 1
+
+
+def test_concurrent_misses_load_once():
+    cache = CountingCache()
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_many(None, [KNOWN]) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+
+    assert cache.loads == [[KNOWN]]
+    assert all(r == {KNOWN: _cached(KNOWN)} for r in results)
+    assert cache._locks == {}
+
+
+def test_unknown_id_is_cached_as_absent():
+    cache = CountingCache()
+
+    first = asyncio.run(cache.get_many(None, [KNOWN, UNKNOWN]))
+    second = asyncio.run(cache.get_many(None, [UNKNOWN]))
+
+    assert first == {KNOWN: _cached(KNOWN)}
+    assert second == {}
+    assert cache.loads == [sorted([KNOWN, UNKNOWN])]
+
+
+def test_expired_entries_are_reloaded():
+    cache = CountingCache(ttl=0)
+
+    asyncio.run(cache.get_many(None, [KNOWN]))
+    asyncio.run(cache.get_many(None, [KNOWN]))
+
+    assert cache.loads == [[KNOWN], [KNOWN]]
+
+
+def test_invalidate_and_clear_force_a_reload():
+    cache = CountingCache(rows=(KNOWN, UNKNOWN))
+
+    asyncio.run(cache.get_many(None, [KNOWN, UNKNOWN]))
+    cache.invalidate(KNOWN)
+    asyncio.run(cache.get_many(None, [KNOWN, UNKNOWN]))
+    cache.clear()
+    asyncio.run(cache.get_many(None, [KNOWN, UNKNOWN]))
+
+    assert cache.loads == [sorted([KNOWN, UNKNOWN]), [KNOWN], sorted([KNOWN, UNKNOWN])]
+
+
+def test_failed_load_releases_locks_and_caches_nothing():
+    cache = CountingCache()
+    cache.fail = True
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_many(None, [KNOWN]))
+
+    assert cache._locks == {}
+    cache.fail = False
+    assert asyncio.run(cache.get_many(None, [KNOWN])) == {KNOWN: _cached(KNOWN)}
+    assert len(cache.loads) == 2
+
+
+def test_max_entries_is_enforced_with_live_entries():
+    ids = [UUID(int=i) for i in range(1, 26)]
+    cache = CountingCache(rows=ids, max_entries=10)
+
+    for sensor_id in ids:
+        asyncio.run(cache.get_many(None, [sensor_id]))
+        assert len(cache._entries) <= 10
+
+    # The newest entry survives; the oldest were evicted first.
+    assert ids[-1] in cache._entries
+    assert ids[0] not in cache._entries
+
+
+def test_random_unknown_ids_cannot_grow_the_cache():
+    cache = CountingCache(max_entries=10)
+
+    asyncio.run(cache.get_many(None, [UUID(int=1000 + i) for i in range(5)]))
+    for i in range(50):
+        asyncio.run(cache.get_many(None, [UUID(int=i + 1), UUID(int=5000 + i)]))
+
+    assert len(cache._entries) <= 10
+
+
+def test_newcomer_waits_on_the_same_lock_after_a_failed_load():
+    cache = CountingCache()
+    cache.fail = True
+    newcomer: list[asyncio.Task] = []
+    original_load = cache._load
+
+    async def failing_once_then_spawn(db, sensor_ids):
+        try:
+            return await original_load(db, sensor_ids)
+        finally:
+            if not newcomer:
+                cache.fail = False
+                # Arrives right as the failed holder releases its lock, before the waiter resumes.
+                newcomer.append(asyncio.create_task(cache.get_many(None, [KNOWN])))
+
+    cache._load = failing_once_then_spawn
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_many(None, [KNOWN]))
+        waiter = asyncio.create_task(cache.get_many(None, [KNOWN]))
+        results = await asyncio.gather(first, waiter, return_exceptions=True)
+        results.append(await newcomer[0])
+        return results
+
+    failed, waited, late = asyncio.run(scenario())
+
+    assert isinstance(failed, RuntimeError)
+    assert waited == late == {KNOWN: _cached(KNOWN)}
+    # The waiter reloads once; the newcomer queues behind it instead of loading in parallel.
+    assert cache.max_in_flight == 1
+    assert len(cache.loads) == 2
+    assert cache._locks == {} and cache._lock_users == {}
@@ -1,4 +1,5 @@
 import { useEffect, useMemo, useState } from 'react'
+import type { ReadingColumns } from '../types/readings'
 import type { Sensor } from '../types/sensors'
 import formatTimestamp from '../utils/formatTimestamp'
 
@@ -66,14 +67,15 @@ export default function SensorCard({ x, apiBase, onSensorUpdated }: SensorCardPr
         if (!res.ok) {
           throw new Error(await formatErrorMessage(res))
         }
-        const data = await res.json()
+        const data = (await res.json()) as ReadingColumns
         if (!alive) return
-        if (Array.isArray(data) && data.length > 0) {
-          const latest = data[data.length - 1] as { value?: unknown; ts?: unknown }
-          const value = latest?.value
+        const last = Array.isArray(data?.ts) ? data.ts.length - 1 : -1
+        if (last >= 0) {
+          const value = data.values[last]
+          const ts = data.ts[last]
           setReading({
             value: value === null || value === undefined ? null : String(value),
-            ts: typeof latest?.ts === 'string' ? latest.ts : null,
+            ts: typeof ts === 'string' ? ts : null,
           })
         } else {
           setReading({ value: null, ts: null })
@@ -2,6 +2,7 @@ import { useEffect, useMemo, useState } from 'react'
 import type { FormEvent } from 'react'
 import { Link } from 'react-router-dom'
 import { useApiBase } from '../../hooks/useApiBase'
+import type { ReadingColumns } from '../../types/readings'
 import type { Sensor } from '../../types/sensors'
 import formatTimestamp from '../../utils/formatTimestamp'
 
@@ -168,8 +169,16 @@ export default function DataViewerPage() {
       if (!res.ok) {
         throw new Error(await res.text())
       }
-      const data = (await res.json()) as Reading[]
-      setReadings(data)
+      const data = (await res.json()) as ReadingColumns
+      setReadings(
+        data.ids.map((id, i) => ({
+          id,
+          sensor_id: data.sensor_id,
+          ts: data.ts[i],
+          value: data.values[i],
+          attributes: data.attributes[i],
+        })),
+      )
     } catch (err) {
       setReadings([])
       setReadingsError(err instanceof Error ? err.message : 'Failed to load readings')
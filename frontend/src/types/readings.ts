@@ -0,0 +1,8 @@
+// Column-oriented payload returned by POST /api/readings/query
+export type ReadingColumns = {
+  sensor_id: string
+  ids: number[]
+  ts: string[]
+  values: number[]
+  attributes: (Record<string, unknown> | null)[]
+}
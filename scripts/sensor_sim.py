@@ -19,7 +19,7 @@ def main():
     while True:
         val = round(22.0 + random.uniform(-1.0, 1.0), 3)
         r = requests.post(f"{API}/ingest", json={"sensor_id":sid, "value":val})
-        print(r.status_code, r.json())
+        print(r.status_code)  # /ingest answers 204 with no body
         time.sleep(1)
 
 if __name__ == "__main__":